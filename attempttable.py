@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+from array import array
+
+import heapq
+
+# NumPy is optional: without it the table progresses in a loop
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+'''
+Remaining seconds of the running attempts in one array, so a step progresses
+all of them at once: remaining -= p*speed (vectorized with NumPy).
+'''
+
+"""
+Table of running attempts. Each attempt gets a row with its remaining seconds
+and the speed of its node (0 while the attempt waits, e.g., a reduce waiting for
+its maps). Free rows have infinite remaining seconds.
+"""
+class AttemptTable:
+	def __init__(self, capacity=1024):
+		self.remaining = AttemptTable.getArray(capacity, float('inf'))
+		self.speed =     AttemptTable.getArray(capacity, 0.0)
+		self.attempts = [None]*capacity
+		self.free = range(0, capacity) # Heap of free rows
+		self.size = 0 # Rows up to the last one used
+
+	@staticmethod
+	def getArray(n, value):
+		if numpy != None:
+			return numpy.full(n, value)
+		return array('d', [value])*n
+
+	def __len__(self):
+		return len(self.attempts) - len(self.free)
+
+	# Double the capacity
+	def grow(self):
+		capacity = len(self.attempts)
+		if numpy != None:
+			self.remaining = numpy.concatenate((self.remaining, AttemptTable.getArray(capacity, float('inf'))))
+			self.speed =     numpy.concatenate((self.speed,     AttemptTable.getArray(capacity, 0.0)))
+		else:
+			self.remaining.extend(AttemptTable.getArray(capacity, float('inf')))
+			self.speed.extend(AttemptTable.getArray(capacity, 0.0))
+		self.attempts.extend([None]*capacity)
+		for row in range(capacity, 2*capacity):
+			heapq.heappush(self.free, row)
+
+	def add(self, attempt, speed):
+		if len(self.free) == 0:
+			self.grow()
+		row = heapq.heappop(self.free)
+		self.remaining[row] = attempt.seconds
+		self.speed[row] = speed
+		self.attempts[row] = attempt
+		attempt.row = row
+		self.size = max(self.size, row+1)
+
+	def setSpeed(self, attempt, speed):
+		self.speed[attempt.row] = speed
+
+	# Remove an attempt updating its remaining seconds
+	def remove(self, attempt):
+		row = attempt.row
+		attempt.seconds = float(self.remaining[row])
+		self.remaining[row] = float('inf')
+		self.speed[row] = 0.0
+		self.attempts[row] = None
+		attempt.row = None
+		heapq.heappush(self.free, row)
+
+	# Update the remaining seconds of the attempts still running
+	def sync(self):
+		for row in xrange(0, self.size):
+			if self.attempts[row] != None:
+				self.attempts[row].seconds = float(self.remaining[row])
+
+	'''
+	Progress all the attempts p seconds. It returns the attempts completed (by row).
+	'''
+	def progress(self, p):
+		if numpy != None:
+			remaining = self.remaining[:self.size]
+			remaining -= p*self.speed[:self.size]
+			return [self.attempts[row] for row in numpy.flatnonzero(remaining <= 0)]
+		ret = []
+		remaining = self.remaining
+		speed = self.speed
+		for row in xrange(0, self.size):
+			if speed[row] != 0.0:
+				remaining[row] -= p*speed[row]
+			if remaining[row] <= 0:
+				ret.append(self.attempts[row])
+		return ret
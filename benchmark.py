@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+from optparse import OptionParser
+
+import itertools
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from job import Job
+from node import Node
+from simulator import Simulator
+
+# Peak resident memory of this process in bytes
+def getMaxRSS():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+'''
+Create jobs with ntasks maps in total and return the memory per task in bytes.
+'''
+def getTaskMemory(ntasks, compact=False, tasksPerJob=1000):
+	jobs = []
+	before = getMaxRSS()
+	for i in range(0, max(1, ntasks/tasksPerJob)):
+		job = Job(jobId='job_201601010000_%04d' % (i+1), nmaps=tasksPerJob, nreds=0)
+		job.compact = compact
+		job.initTasks()
+		jobs.append(job)
+	return 1.0*(getMaxRSS() - before)/(len(jobs)*tasksPerJob)
+
+# Measure in a new process so the peak memory is not shared
+def runTaskMemory(ntasks, compact=False):
+	cmd = [sys.executable, __file__, 'taskmemory', '-t', str(ntasks)]
+	if compact:
+		cmd.append('-c')
+	return float(subprocess.check_output(cmd))
+
+def benchmarkTaskMemory(ntasks):
+	objects = runTaskMemory(ntasks, compact=False)
+	arrays = runTaskMemory(ntasks, compact=True)
+	print 'Tasks:   %d' % ntasks
+	print 'Objects: %.1f bytes/task' % objects
+	print 'Arrays:  %.1f bytes/task' % arrays
+	print 'Ratio:   %.1fx' % (objects/arrays if arrays > 0 else float('inf'))
+
+'''
+Synthetic workload: njobs jobs with nmaps maps each and one reduce per 100 maps,
+submitted every 10 seconds.
+'''
+def getSyntheticJobs(njobs, nmaps):
+	for i in xrange(0, njobs):
+		yield Job(nmaps=nmaps, lmap=60, nreds=max(1, nmaps/100), lred=30, submit=10*i)
+
+'''
+Simulate a synthetic workload and return its measures.
+'''
+def getSimulation(njobs, nmaps, nnodes, events=True, compact=False):
+	simulator = Simulator(logfile=None, seed=0)
+	simulator.eventDriven = events
+	simulator.compactTasks = compact
+	simulator.releaseTasks = compact
+	for i in range(0, nnodes):
+		node = Node('node%05d' % i)
+		node.numMaps = 4
+		node.numReds = 1
+		simulator.nodes[node.nodeId] = node
+	simulator.addJobSource(getSyntheticJobs(njobs, nmaps))
+	start = time.time()
+	simulator.run()
+	wall = time.time() - start
+	return {'jobs': njobs, 'maps': nmaps, 'nodes': nnodes, 'wall': wall, 'rss': getMaxRSS(), 'simtime': simulator.t, 'speed': simulator.t/wall if wall > 0 else None}
+
+# Measure in a new process so the peak memory is not shared
+def runSimulation(njobs, nmaps, nnodes, events=True, compact=False):
+	cmd = [sys.executable, __file__, 'simulate', '--njobs', str(njobs), '--nmaps', str(nmaps), '--nnodes', str(nnodes)]
+	if events:
+		cmd.append('-e')
+	if compact:
+		cmd.append('-c')
+	return json.loads(subprocess.check_output(cmd))
+
+def getKey(result):
+	return (result['jobs'], result['maps'], result['nodes'])
+
+'''
+Compare the results with a baseline. It returns the regressions: (result, measure, baseline value).
+Differences smaller than the noise of the measure (MIN_CHANGE) are ignored.
+'''
+MIN_CHANGE = {'wall': 0.5, 'rss': 4*1024*1024}
+
+def getRegressions(results, baseline, tolerance=0.25):
+	ret = []
+	baseline = dict((getKey(result), result) for result in baseline)
+	for result in results:
+		if getKey(result) in baseline:
+			base = baseline[getKey(result)]
+			for measure in ('wall', 'rss'):
+				if result[measure] > base[measure]*(1.0+tolerance) and result[measure] - base[measure] > MIN_CHANGE[measure]:
+					ret.append((result, measure, base[measure]))
+	return ret
+
+'''
+Run the simulator over a grid of synthetic workloads (skipping the points with more than maxTasks maps).
+'''
+def benchmarkScaling(jobsGrid, mapsGrid, nodesGrid, maxTasks, events=True, compact=False):
+	results = []
+	for njobs, nmaps, nnodes in itertools.product(jobsGrid, mapsGrid, nodesGrid):
+		if njobs*nmaps > maxTasks:
+			continue
+		result = runSimulation(njobs, nmaps, nnodes, events, compact)
+		results.append(result)
+		print >>sys.stderr, 'Jobs: %6d Maps: %5d Nodes: %5d  %8.2fs %7.1fMB %10.0f sim-s/wall-s' % (njobs, nmaps, nnodes, result['wall'], result['rss']/(1024.0*1024.0), result['speed'] or 0)
+	return results
+
+def getGrid(values):
+	return [int(float(value)) for value in values.split(',')]
+
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog [options] memory|taskmemory|scaling|simulate")
+	parser.add_option('-t', "--tasks",                      dest="tasks",     type="int",    default=1000000, help="specify the number of tasks")
+	parser.add_option('-c', "--compact",action="store_true", dest="compact",   default=False, help="store the tasks in typed arrays")
+	parser.add_option('-e', "--events",action="store_true", dest="events",    default=False, help="jump between events instead of iterating every second")
+	parser.add_option('-J', "--jobs",                       dest="jobs",      type="string", default="1e2,1e3,1e4,1e5", help="jobs of the scaling grid")
+	parser.add_option('-M', "--maps",                       dest="maps",      type="string", default="1,1e2,1e4",       help="maps per job of the scaling grid")
+	parser.add_option('-N', "--nodes",                      dest="nodes",     type="string", default="10,1e2,1e3,1e4",  help="nodes of the scaling grid")
+	parser.add_option('-L', "--limit",                      dest="limit",     type="int",    default=1000000, help="skip the points with more maps than this")
+	parser.add_option('-o', "--out",                        dest="out",       type="string", default=None,  help="save the results as a JSON baseline")
+	parser.add_option('-B', "--baseline",                   dest="baseline",  type="string", default=None,  help="compare the results with this JSON baseline")
+	parser.add_option('-T', "--tolerance",                  dest="tolerance", type="float",  default=0.25,  help="relative slowdown or memory growth that is a regression")
+	parser.add_option("--njobs",                            dest="njobs",     type="int",    default=100,   help="jobs of a simulation")
+	parser.add_option("--nmaps",                            dest="nmaps",     type="int",    default=100,   help="maps per job of a simulation")
+	parser.add_option("--nnodes",                           dest="nnodes",    type="int",    default=10,    help="nodes of a simulation")
+	(options, args) = parser.parse_args()
+
+	command = args[0] if len(args) > 0 else 'memory'
+	if command == 'memory':
+		benchmarkTaskMemory(options.tasks)
+	elif command == 'taskmemory':
+		print getTaskMemory(options.tasks, compact=options.compact)
+	elif command == 'simulate':
+		print json.dumps(getSimulation(options.njobs, options.nmaps, options.nnodes, events=options.events, compact=options.compact))
+	elif command == 'scaling':
+		results = benchmarkScaling(getGrid(options.jobs), getGrid(options.maps), getGrid(options.nodes), options.limit, events=options.events, compact=options.compact)
+		if options.out != None:
+			with open(options.out, 'w') as f:
+				json.dump(results, f, indent=1, sort_keys=True)
+		if options.baseline != None:
+			with open(options.baseline) as f:
+				regressions = getRegressions(results, json.load(f), options.tolerance)
+			for result, measure, base in regressions:
+				print 'Regression: jobs=%d maps=%d nodes=%d %s %.2f -> %.2f' % (result['jobs'], result['maps'], result['nodes'], measure, base, result[measure])
+			if len(regressions) > 0:
+				sys.exit(1)
+			print 'No regressions in %d points' % len(results)
+	else:
+		parser.error('unknown benchmark %s' % command)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+from node import Node
+
+'''
+Cluster specification: classes of nodes (e.g., hardware generations) with their
+number of nodes, slots, speed and network bandwidth (MB/s). One class per line:
+# name nodes mapslots redslots speed bandwidth
+old    10   4        1        1.0   128
+new    20   8        2        1.5   1280
+'''
+
+"""
+Class of nodes in the cluster.
+"""
+class NodeClass:
+	def __init__(self, name, nodes, numMaps, numReds, speed=1.0, bandwidth=128.0):
+		self.name = name
+		self.nodes = nodes
+		self.numMaps = numMaps
+		self.numReds = numReds
+		# Speeds are multiples of 1/1024 so the progress of the attempts is exact
+		self.speed = round(speed*1024)/1024.0
+		if self.speed <= 0:
+			raise ValueError('the speed of %s must be positive' % name)
+		self.bandwidth = bandwidth
+		if self.bandwidth <= 0:
+			raise ValueError('the bandwidth of %s must be positive' % name)
+
+	def getNodes(self):
+		ret = []
+		for i in range(0, self.nodes):
+			node = Node('%s%03d' % (self.name, i))
+			node.numMaps = self.numMaps
+			node.numReds = self.numReds
+			node.speed = self.speed
+			node.bandwidth = self.bandwidth
+			ret.append(node)
+		return ret
+
+'''
+Read the classes of a cluster specification file (bandwidth: default of the classes without one).
+'''
+def readCluster(filename, bandwidth=128.0):
+	ret = []
+	with open(filename, 'r') as f:
+		for lineno, line in enumerate(f, 1):
+			line = line.strip()
+			if line.startswith('#') or len(line) == 0:
+				continue
+			splits = line.split()
+			if len(splits) < 4:
+				raise ValueError('%s:%d: expected name nodes mapslots redslots [speed] [bandwidth]' % (filename, lineno))
+			speed = float(splits[4]) if len(splits) > 4 else 1.0
+			nodeBandwidth = float(splits[5]) if len(splits) > 5 else bandwidth
+			ret.append(NodeClass(splits[0], int(splits[1]), int(splits[2]), int(splits[3]), speed, nodeBandwidth))
+	return ret
+
+# Nodes of all the classes of a cluster
+def getNodes(classes):
+	ret = []
+	for nodeClass in classes:
+		ret += nodeClass.getNodes()
+	return ret
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from optparse import OptionParser
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+'''
+Check that the ways of running a simulation produce the same history: the
+engines (steps, events, vectorized and compact tasks), streaming the workload
+and restoring a checkpoint. Each simulation runs runsimulator in a new process.
+'''
+
+RUNSIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runsimulator.py')
+
+# Engines that must produce the history of the step engine
+ENGINES = [['-e'], ['-V'], ['-c', '-R']]
+
+# Heterogeneous cluster: name nodes mapslots redslots speed
+CLUSTER = 'old 3 4 1 0.75\nmid 3 4 1\nnew 3 6 2 1.5\n'
+
+# Options checked with every engine (%(cluster)s is the cluster file)
+CASES = [
+	[],
+	['-s', '0.5'],
+	['-m'],
+	['-L'],
+	['-H', '%(cluster)s'],
+	['-p', 'fair', '-s', '0.5'],
+	['--slowstart', '0.05', '--mapoutput', '256'],
+]
+
+# The job ids contain the time the simulation started
+JOB_ID = re.compile(r'_\d{12}_')
+
+def getHistory(filename):
+	with open(filename, 'r') as f:
+		return JOB_ID.sub('_X_', f.read())
+
+'''
+Simulate the workload and return its history. It runs in a temporary directory.
+'''
+def runSimulation(workload, args, tmpdir):
+	log = os.path.join(tmpdir, 'history.log')
+	if os.path.exists(log):
+		os.remove(log)
+	with open(os.devnull, 'w') as devnull:
+		subprocess.check_call([sys.executable, RUNSIMULATOR, '-f', workload, '-l', log] + args, stdout=devnull, cwd=tmpdir)
+	return getHistory(log)
+
+# Save a checkpoint at time t, continue the simulation from it and return the history
+def runRestored(workload, args, t, tmpdir):
+	checkpoint = os.path.join(tmpdir, 'checkpoint.pkl')
+	runSimulation(workload, args + ['-k', checkpoint, '-a', str(t)], tmpdir)
+	with open(os.devnull, 'w') as devnull:
+		subprocess.check_call([sys.executable, RUNSIMULATOR, '-f', workload, '-u', checkpoint] + args, stdout=devnull, cwd=tmpdir)
+	return getHistory(os.path.join(tmpdir, 'history.log'))
+
+'''
+Run the checks and return the failed ones: (case, variant).
+'''
+def check(workload, checkpointAt, tmpdir, out=sys.stdout):
+	failed = []
+	cluster = os.path.join(tmpdir, 'cluster.txt')
+	with open(cluster, 'w') as f:
+		f.write(CLUSTER)
+	workload = os.path.abspath(workload)
+	for case in CASES:
+		case = [arg % {'cluster': cluster} for arg in case]
+		base = runSimulation(workload, case, tmpdir)
+		variants = [(' '.join(engine), runSimulation(workload, case + engine, tmpdir)) for engine in ENGINES]
+		variants.append(('-S', runSimulation(workload, case + ['-S'], tmpdir)))
+		for engine in [[]] + ENGINES:
+			variants.append((' '.join(engine + ['restored']), runRestored(workload, case + engine, checkpointAt, tmpdir)))
+		for variant, history in variants:
+			same = history == base
+			print >>out, '%-4s %-40s %s' % ('OK' if same else 'DIFF', ' '.join(case).replace(cluster, 'cluster') or 'default', variant)
+			if not same:
+				failed.append((case, variant))
+	return failed
+
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog [options]")
+	parser.add_option('-f', "--infile",                     dest="infile",    type="string", default=os.path.join(os.path.dirname(RUNSIMULATOR), 'demo.wl'), help="workload file")
+	parser.add_option('-a', "--checkpointat",               dest="checkpointat", type="int", default=1000,  help="simulated time of the checkpoint to restore")
+	(options, args) = parser.parse_args()
+
+	tmpdir = tempfile.mkdtemp()
+	try:
+		failed = check(options.infile, options.checkpointat, tmpdir)
+	finally:
+		shutil.rmtree(tmpdir)
+	if len(failed) > 0:
+		print 'Failed: %d checks' % len(failed)
+		sys.exit(1)
+	print 'All the variants produce the same history'
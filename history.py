@@ -7,9 +7,43 @@ from job import Attempt
 
 from commons import timeStr
 
+import Queue
+import heapq
+import re
+import struct
+import tempfile
+import threading
+
+from array import array
 from math import floor, ceil
+from optparse import OptionParser
 from operator import attrgetter
 from operator import itemgetter
+from collections import namedtuple
+
+'''
+Records of a history.
+'''
+class JobRecord(namedtuple('JobRecord', 'jobId status submit start finish')):
+	__slots__ = ()
+
+class TaskRecord(namedtuple('TaskRecord', 'taskId status')):
+	__slots__ = ()
+
+class AttemptRecord(namedtuple('AttemptRecord', 'taskType taskId attemptId status start finish nodeId')):
+	__slots__ = ()
+
+	def isMap(self):
+		return self.taskType == Task.Type.MAP
+
+	def isRed(self):
+		return self.taskType == Task.Type.RED
+
+	def getTaskId(self):
+		return self.taskId
+
+class NodeRecord(namedtuple('NodeRecord', 'nodeId time status')):
+	__slots__ = ()
 
 '''
 Store a simulation history.
@@ -30,13 +64,33 @@ class History:
 	def getFilename(self):
 		return self.filename
 
+	# Write everything to the file
+	def sync(self):
+		if self.filename != None:
+			self.file.flush()
+
+	# Checkpoints store the position in the file and continue writing from there
+	def __getstate__(self):
+		self.sync()
+		state = self.__dict__.copy()
+		if self.filename != None:
+			state['file'] = self.file.tell()
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		if self.filename != None:
+			self.file = open(self.filename, 'r+')
+			self.file.truncate(state['file'])
+			self.file.seek(state['file'])
+
 	def logJob(self, job):
 		if self.filename != None:
-			self.file.write('Job JOBID="%s" JOB_STATUS="%s" SUBMIT_TIME="%d" START_TIME="%d" FINISH_TIME="%d" .\n' % (job.jobId, Job.Status.toString[job.status], job.submit, job.getStart(), job.getFinish()))
+			self.writeJob(job.jobId, Job.Status.toString[job.status], job.submit, job.getStart(), job.getFinish())
 
 	def logTask(self, task):
 		if self.filename != None:
-			self.file.write('Task TASKID="%s" TASK_STATUS=%s" .\n' % (task.taskId, Job.Status.toString[task.status]))
+			self.writeTask(task.taskId, Job.Status.toString[task.status])
 
 	def logAttempt(self, attempt):
 		if attempt.isMap():
@@ -46,16 +100,294 @@ class History:
 
 	def logMapAttempt(self, attempt):
 		if self.filename != None:
-			self.file.write('MapAttempt TASKID="%s" TASK_ATTEMPT_ID="%s" TASK_STATUS="%s" START_TIME="%d" FINISH_TIME="%d" HOSTNAME="%s" .\n' % (attempt.getTaskId(), attempt.attemptId, attempt.status, attempt.start, attempt.finish, attempt.nodeId))
+			self.writeAttempt('MapAttempt', attempt.getTaskId(), attempt.attemptId, attempt.status, attempt.start, attempt.finish, attempt.nodeId)
 
 	def logReduceAttempt(self, attempt):
 		if self.filename != None:
-			self.file.write('ReduceAttempt TASKID="%s" TASK_ATTEMPT_ID="%s" TASK_STATUS="%s" START_TIME="%d" FINISH_TIME="%d" HOSTNAME="%s" .\n' % (attempt.getTaskId(), attempt.attemptId, attempt.status, attempt.start, attempt.finish, attempt.nodeId))
+			self.writeAttempt('ReduceAttempt', attempt.getTaskId(), attempt.attemptId, attempt.status, attempt.start, attempt.finish, attempt.nodeId)
 
 	def logNodeStatus(self, t, node):
 		if self.filename != None:
-			self.file.write('Node HOSTNAME="%s" TIME="%d" STATUS="%s" .\n' % (node.nodeId, t, node.status))
+			self.writeNodeStatus(node.nodeId, t, node.status)
+
+	# Text lines
+	def writeJob(self, jobId, status, submit, start, finish):
+		self.file.write('Job JOBID="%s" JOB_STATUS="%s" SUBMIT_TIME="%d" START_TIME="%d" FINISH_TIME="%d" .\n' % (jobId, status, submit, start, finish))
+
+	def writeTask(self, taskId, status):
+		self.file.write('Task TASKID="%s" TASK_STATUS=%s" .\n' % (taskId, status))
 
+	def writeAttempt(self, kind, taskId, attemptId, status, start, finish, nodeId):
+		self.file.write('%s TASKID="%s" TASK_ATTEMPT_ID="%s" TASK_STATUS="%s" START_TIME="%d" FINISH_TIME="%d" HOSTNAME="%s" .\n' % (kind, taskId, attemptId, status, start, finish, nodeId))
+
+	def writeNodeStatus(self, nodeId, t, status):
+		self.file.write('Node HOSTNAME="%s" TIME="%d" STATUS="%s" .\n' % (nodeId, t, status))
+
+'''
+Store a simulation history as fixed-size binary records.
+The records are packed in a memory buffer and written in large chunks, optionally
+by a writer thread. Strings (ids, hostnames, status) are written once as NAME
+records and then referenced by their index.
+'''
+class BinaryHistory:
+	MAGIC = 'HSHB'
+	VERSION = 1
+	HEADER = struct.Struct('<4sII') # Magic, version, record size
+	# Kind, task type, name, 7 values
+	EVENT = struct.Struct('<BB2xi7q')
+	# Kind, name index, string
+	NAME = struct.Struct('<B3xi56s')
+	RECORD_SIZE = 64
+
+	# Record kinds
+	class Kind:
+		NAME    = 0
+		JOB     = 1
+		TASK    = 2
+		ATTEMPT = 3
+		NODE    = 4
+
+	def __init__(self, filename='history.bin', bufferSize=1024*1024, background=False):
+		self.filename = filename
+		self.background = background # Write the chunks in a thread
+		self.names = {}
+		self.buffer = bytearray(max(1, bufferSize/BinaryHistory.RECORD_SIZE)*BinaryHistory.RECORD_SIZE)
+		self.offset = 0
+		self.queue = None
+		self.writer = None
+		if self.filename != None:
+			self.file = open(self.filename, 'wb')
+			self.file.write(BinaryHistory.HEADER.pack(BinaryHistory.MAGIC, BinaryHistory.VERSION, BinaryHistory.RECORD_SIZE))
+
+	def __del__(self):
+		self.close()
+
+	def close(self):
+		if self.filename != None and not self.file.closed:
+			self.sync()
+			self.file.close()
+
+	def getFilename(self):
+		return self.filename
+
+	# Write everything to the file and stop the writer thread
+	def sync(self):
+		if self.filename != None and not self.file.closed:
+			self.flush()
+			if self.writer != None:
+				self.queue.put(None)
+				self.writer.join()
+				self.writer = None
+			self.file.flush()
+
+	# Checkpoints write everything and store the position in the file
+	def __getstate__(self):
+		self.sync()
+		state = self.__dict__.copy()
+		state['buffer'] = len(self.buffer)
+		state['queue'] = None
+		if self.filename != None:
+			state['file'] = self.file.tell()
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.buffer = bytearray(state['buffer'])
+		if self.filename != None:
+			self.file = open(self.filename, 'r+b')
+			self.file.truncate(state['file'])
+			self.file.seek(state['file'])
+
+	# Write the buffer to the file (or pass it to the writer thread)
+	def flush(self):
+		if self.offset == 0:
+			return
+		if self.background:
+			if self.writer == None:
+				self.queue = Queue.Queue(maxsize=8)
+				self.writer = threading.Thread(target=self.write)
+				self.writer.daemon = True
+				self.writer.start()
+			self.queue.put(buffer(self.buffer, 0, self.offset))
+			self.buffer = bytearray(len(self.buffer))
+		else:
+			self.file.write(buffer(self.buffer, 0, self.offset))
+		self.offset = 0
+
+	# Writer thread
+	def write(self):
+		chunk = self.queue.get()
+		while chunk != None:
+			self.file.write(chunk)
+			chunk = self.queue.get()
+
+	def pack(self, record, *values):
+		record.pack_into(self.buffer, self.offset, *values)
+		self.offset += BinaryHistory.RECORD_SIZE
+		if self.offset >= len(self.buffer):
+			self.flush()
+
+	# Index of a string (written the first time it appears)
+	def getName(self, name):
+		name = str(name)
+		if name not in self.names:
+			if len(name) > 56:
+				raise ValueError('name too long for the binary history: %s' % name)
+			self.names[name] = len(self.names)
+			self.pack(BinaryHistory.NAME, BinaryHistory.Kind.NAME, self.names[name], name)
+		return self.names[name]
+
+	def logJob(self, job):
+		if self.filename != None:
+			start = job.getStart()
+			finish = job.getFinish()
+			self.pack(BinaryHistory.EVENT, BinaryHistory.Kind.JOB, 0, self.getName(job.jobId), self.getName(Job.Status.toString[job.status]), job.submit, start if start != None else -1, finish if finish != None else -1, 0, 0, 0)
+
+	def logTask(self, task):
+		if self.filename != None:
+			self.pack(BinaryHistory.EVENT, BinaryHistory.Kind.TASK, 0, self.getName(task.taskId), self.getName(Job.Status.toString[task.status]), 0, 0, 0, 0, 0, 0)
+
+	def logAttempt(self, attempt):
+		if self.filename != None:
+			taskType = Task.Type.MAP if attempt.isMap() else Task.Type.RED
+			number = attempt.number if attempt.number != None else ID.getId(attempt.attemptId)
+			self.pack(BinaryHistory.EVENT, BinaryHistory.Kind.ATTEMPT, taskType, self.getName(attempt.getJobId()), attempt.getId(), number, attempt.start, attempt.finish, self.getName(attempt.nodeId), self.getName(attempt.status), 0)
+
+	def logNodeStatus(self, t, node):
+		if self.filename != None:
+			self.pack(BinaryHistory.EVENT, BinaryHistory.Kind.NODE, 0, self.getName(node.nodeId), t, self.getName(node.status), 0, 0, 0, 0, 0)
+
+	@staticmethod
+	def isBinary(filename):
+		with open(filename, 'rb') as f:
+			return f.read(len(BinaryHistory.MAGIC)) == BinaryHistory.MAGIC
+
+	'''
+	Read a binary history. It generates the records (JobRecord, TaskRecord, AttemptRecord and NodeRecord).
+	'''
+	@staticmethod
+	def read(filename, chunk=4096):
+		with open(filename, 'rb') as f:
+			magic, version, size = BinaryHistory.HEADER.unpack(f.read(BinaryHistory.HEADER.size))
+			if magic != BinaryHistory.MAGIC or version != BinaryHistory.VERSION:
+				raise ValueError('%s is not a binary history' % filename)
+			names = []
+			data = f.read(chunk*size)
+			while len(data) > 0:
+				for offset in xrange(0, len(data) - len(data)%size, size):
+					kind = ord(data[offset])
+					if kind == BinaryHistory.Kind.NAME:
+						kind, index, name = BinaryHistory.NAME.unpack_from(data, offset)
+						names.append(name.rstrip('\0'))
+						continue
+					kind, taskType, name, v0, v1, v2, v3, v4, v5, v6 = BinaryHistory.EVENT.unpack_from(data, offset)
+					if kind == BinaryHistory.Kind.ATTEMPT:
+						taskId = ID.getTaskId(names[name], taskType, v0)
+						yield AttemptRecord(taskType, taskId, ID.getAttemptId(taskId, v1), names[v5], v2, v3, names[v4])
+					elif kind == BinaryHistory.Kind.JOB:
+						yield JobRecord(names[name], names[v0], v1, v2, v3)
+					elif kind == BinaryHistory.Kind.NODE:
+						yield NodeRecord(names[name], v0, names[v1])
+					elif kind == BinaryHistory.Kind.TASK:
+						yield TaskRecord(names[name], names[v0])
+				data = data[len(data) - len(data)%size:] + f.read(chunk*size)
+				if len(data) < size:
+					break
+
+'''
+Convert a binary history into the text format.
+'''
+def convertHistory(filenamein, filenameout):
+	history = History(filenameout)
+	for record in BinaryHistory.read(filenamein):
+		if isinstance(record, AttemptRecord):
+			kind = 'MapAttempt' if record.isMap() else 'ReduceAttempt'
+			history.writeAttempt(kind, record.taskId, record.attemptId, record.status, record.start, record.finish, record.nodeId)
+		elif isinstance(record, JobRecord):
+			history.writeJob(record.jobId, record.status, record.submit, record.start, record.finish)
+		elif isinstance(record, NodeRecord):
+			history.writeNodeStatus(record.nodeId, record.time, record.status)
+		elif isinstance(record, TaskRecord):
+			history.writeTask(record.taskId, record.status)
+	history.close()
+
+"""
+Slots of the attempts of each node for the node plots (interval partitioning).
+While reading, it keeps only the start, finish and type of each attempt. Then
+each node goes by start time: an attempt goes into the slot that finished first,
+if it is free, or into a new slot. The number of slots is the peak concurrency
+of the node whatever the order of the history. The cells of the slots are
+written into a temporary file, each cell links to the next one of its slot.
+"""
+class NodeSlots:
+	LINK =   struct.Struct('<q') # Offset of the next cell of the slot (-1 for the last one)
+	LENGTH = struct.Struct('<I')
+
+	def __init__(self):
+		self.file = tempfile.TemporaryFile()
+		self.size = 0
+		# Node -> start, finish and type of each attempt
+		self.attempts = {}
+		# Node -> [first cell, last cell] of each slot
+		self.slots = {}
+
+	def close(self):
+		self.file.close()
+
+	def getNodeIds(self):
+		return self.slots.keys()
+
+	def getNumSlots(self, nodeId):
+		return len(self.slots[nodeId])
+
+	def add(self, nodeId, attempt):
+		if nodeId not in self.attempts:
+			self.attempts[nodeId] = array('l')
+		self.attempts[nodeId].extend((attempt.start, attempt.finish, attempt.taskType))
+
+	'''
+	Place the attempts of every node into slots and write their cells.
+	getCell(attempt, prev) returns the cell of an attempt after the previous finish of the slot.
+	'''
+	def place(self, getCell):
+		for nodeId in self.attempts.keys():
+			values = self.attempts.pop(nodeId)
+			attempts = [AttemptRecord(values[i+2], None, None, None, values[i], values[i+1], nodeId) for i in range(0, len(values), 3)]
+			del values
+			slots = self.slots[nodeId] = []
+			ends = [] # Heap of (finish, slot)
+			for attempt in sorted(attempts, key=attrgetter('start', 'finish')):
+				if len(ends) > 0 and ends[0][0] <= attempt.start:
+					prev, slot = ends[0]
+					heapq.heapreplace(ends, (attempt.finish, slot))
+				else:
+					# Every slot is busy, create a new one
+					prev, slot = 0, len(slots)
+					slots.append([None, None])
+					heapq.heappush(ends, (attempt.finish, slot))
+				self.write(slots[slot], getCell(attempt, prev))
+
+	# Append a cell to a slot
+	def write(self, slot, cell):
+		offset = self.size
+		if slot[1] != None:
+			self.file.seek(slot[1])
+			self.file.write(NodeSlots.LINK.pack(offset))
+			self.file.seek(offset)
+		else:
+			slot[0] = offset
+		slot[1] = offset
+		self.file.write(NodeSlots.LINK.pack(-1) + NodeSlots.LENGTH.pack(len(cell)) + cell)
+		self.size += NodeSlots.LINK.size + NodeSlots.LENGTH.size + len(cell)
+
+	# Cells of a slot in order
+	def getCells(self, nodeId, slot):
+		offset = self.slots[nodeId][slot][0]
+		while offset >= 0:
+			self.file.seek(offset)
+			offset, = NodeSlots.LINK.unpack(self.file.read(NodeSlots.LINK.size))
+			length, = NodeSlots.LENGTH.unpack(self.file.read(NodeSlots.LENGTH.size))
+			yield self.file.read(length)
 
 '''
 Generate an HTML with the trace.
@@ -76,6 +408,9 @@ class HistoryViewer:
 			self.plotNodes = True
 			self.plotNodesStatus = True
 
+			# Peak concurrency of each node (computed with the Nodes section)
+			self.peaks = {}
+
 	def __del__(self):
 		self.close()
 
@@ -87,14 +422,58 @@ class HistoryViewer:
 	def getDict(self, strings):
 		ret = {}
 		for keyvalue in strings:
-			key, value = keyvalue.split('=')
-			while value.startswith('"'):
-				value = value[1:]
-			while value.endswith('"'):
-				value = value[:-1]
-			ret[key] = value
+			key, value = keyvalue.split('=', 1)
+			ret[key] = value.strip('"')
 		return ret
 
+	# Lines written by History
+	JOB_LINE =     re.compile(r'Job JOBID="([^"]*)" JOB_STATUS="([^"]*)" SUBMIT_TIME="(-?\d+)" START_TIME="(-?\d+)" FINISH_TIME="(-?\d+)" ')
+	ATTEMPT_LINE = re.compile(r'(Map|Reduce)Attempt TASKID="([^"]*)" TASK_ATTEMPT_ID="([^"]*)" TASK_STATUS="([^"]*)" START_TIME="(-?\d+)" FINISH_TIME="(-?\d+)" HOSTNAME="([^"]*)" ')
+	NODE_LINE =    re.compile(r'Node HOSTNAME="([^"]*)" TIME="(-?\d+)" STATUS="([^"]*)" ')
+
+	'''
+	Parse a line of a text history into a record (None if it is not a record).
+	'''
+	def parseLine(self, line):
+		if line.startswith('MapAttempt') or line.startswith('ReduceAttempt'):
+			match = HistoryViewer.ATTEMPT_LINE.match(line)
+			if match != None:
+				kind, taskId, attemptId, status, start, finish, nodeId = match.groups()
+				return AttemptRecord(Task.Type.MAP if kind == 'Map' else Task.Type.RED, taskId, attemptId, status, int(start), int(finish), nodeId)
+			ret = self.getDict(line.split(' ')[1:-1])
+			return AttemptRecord(Task.Type.MAP if line.startswith('MapAttempt') else Task.Type.RED, ret['TASKID'], ret['TASK_ATTEMPT_ID'], ret['TASK_STATUS'], int(ret['START_TIME']), int(ret['FINISH_TIME']), ret['HOSTNAME'])
+		elif line.startswith('Job'):
+			match = HistoryViewer.JOB_LINE.match(line)
+			if match != None:
+				jobId, status, submit, start, finish = match.groups()
+				return JobRecord(jobId, status, int(submit), int(start), int(finish))
+			ret = self.getDict(line.split(' ')[1:-1])
+			return JobRecord(ret['JOBID'], ret['JOB_STATUS'], int(ret['SUBMIT_TIME']), int(ret['START_TIME']), int(ret['FINISH_TIME']))
+		elif line.startswith('Node'):
+			match = HistoryViewer.NODE_LINE.match(line)
+			if match != None:
+				nodeId, t, status = match.groups()
+				return NodeRecord(nodeId, int(t), status)
+			ret = self.getDict(line.split(' ')[1:-1])
+			return NodeRecord(ret['HOSTNAME'], int(ret['TIME']), ret['STATUS'])
+		elif line.startswith('Task'):
+			ret = self.getDict(line.split(' ')[1:-1])
+			return TaskRecord(ret['TASKID'], ret['TASK_STATUS'])
+		return None
+
+	'''
+	Read the history (text or binary) in a single pass. It generates the records.
+	'''
+	def getRecords(self):
+		if BinaryHistory.isBinary(self.filenamein):
+			for record in BinaryHistory.read(self.filenamein):
+				yield record
+		else:
+			for line in self.filein:
+				record = self.parseLine(line)
+				if record != None:
+					yield record
+
 	def getTaskGraph(self, attempt):
 		content = str(ID.getId(attempt.getTaskId()))
 		content = ''
@@ -112,15 +491,19 @@ class HistoryViewer:
 		out += '<tr height="5px">\n'
 		prev = 0
 		for attempt in attempts:
-			content = str(ID.getId(attempt.getTaskId()))
-			content = ''
-			out += '<td width="' + str(floor(1.0*(attempt.start -   prev)*self.zoom)) + 'px" bgcolor="white"/>\n'
-			out += '<td width="' + str(floor(1.0*(attempt.finish-attempt.start)*self.zoom)) + 'px" style="background-color:'+self.getTaskColor(attempt)+'; color:#FFFFFF; font-size:small; border-color:black; border:1px solid:black; border-style: inset; border-width:1px;" align="left">'+content+'</td>\n'
+			out += self.getTaskCell(attempt, prev)
 			prev = attempt.finish
 		out += "</tr>";
 		out += "</table>\n";
 		return out
 
+	# Cells of an attempt in a slot after an attempt that finished at prev
+	def getTaskCell(self, attempt, prev):
+		content = ''
+		out =  '<td width="' + str(floor(1.0*(attempt.start -   prev)*self.zoom)) + 'px" bgcolor="white"/>\n'
+		out += '<td width="' + str(floor(1.0*(attempt.finish-attempt.start)*self.zoom)) + 'px" style="background-color:'+self.getTaskColor(attempt)+'; color:#FFFFFF; font-size:small; border-color:black; border:1px solid:black; border-style: inset; border-width:1px;" align="left">'+content+'</td>\n'
+		return out
+
 	def getJobGraph(self, job):
 		content = ''
 		out =  '<table  border="0" cellspacing="0" cellpadding="0">';
@@ -172,65 +555,48 @@ class HistoryViewer:
 	'''
 	def generate(self):
 		if self.filenamein != None and self.filenameout != None:
-			# Read all the information
+			# Keep the attempts only for the sections that draw them one by one
+			keepAttempts = self.plotTasks
+			keepNodeAttempts = self.plotNodeTasks
+			# Read all the information in a single pass
 			jobs = {}
 			attempts = []
+			nodeAttempts = {} # Node -> Attempts
+			nodeSlots = NodeSlots() if self.plotNodes else None
 			nodes = {}
-			for line in self.filein.readlines():
-				if line.startswith('Job'):
-					ret = self.getDict(line.split(' ')[1:-1])
-					jobId = ret['JOBID']
-					if jobId not in jobs:
-						jobs[jobId] = Job(jobId=jobId)
-					jobs[jobId].status = ret['JOB_STATUS']
-					jobs[jobId].submit = int(ret['SUBMIT_TIME'])
-					jobs[jobId].start =  int(ret['START_TIME'])
-					jobs[jobId].finish = int(ret['FINISH_TIME'])
-				elif line.startswith('Task'):
-					pass
-				elif line.startswith('MapAttempt') or line.startswith('ReduceAttempt'):
-					ret = self.getDict(line.split(' ')[1:-1])
-					attempt = Attempt()
-					attempt.attemptId = ret['TASK_ATTEMPT_ID']
-					attempt.start =  int(ret['START_TIME'])
-					attempt.finish = int(ret['FINISH_TIME'])
-					attempt.status = ret['TASK_STATUS']
-					attempt.nodeId = ret['HOSTNAME']
-					attempts.append(attempt)
-					# Update job information
-					jobId = attempt.getJobId()
-					if jobId not in jobs:
-						jobs[jobId] = Job(jobId=jobId)
-					jobs[jobId].addAttempt(attempt)
-				elif line.startswith('Node'):
-					ret = self.getDict(line.split(' ')[1:-1])
-					nodeId = ret['HOSTNAME']
-					if nodeId not in nodes:
-						nodes[nodeId] = []
-					nodes[nodeId].append((int(ret['TIME']), ret['STATUS']))
-
-			# Node -> Attempts
-			nodeAttempts = {}
-			for attempt in attempts:
-				if attempt.nodeId not in nodeAttempts:
-					nodeAttempts[attempt.nodeId] = []
-				nodeAttempts[attempt.nodeId].append(attempt)
-			if 'None' in nodeAttempts:
-				del nodeAttempts['None']
-
+			nattempts = 0
 			totalJobTime = 0
 			totalJobRunTime = 0
-			for jobId in jobs:
-				job = jobs[jobId]
-				totalJobTime += job.finish - job.submit
-				totalJobRunTime += job.finish - job.start
-			totalJobTime = totalJobTime/len(jobs)
-			totalJobRunTime = totalJobRunTime/len(jobs)
+			for record in self.getRecords():
+				if isinstance(record, AttemptRecord):
+					nattempts += 1
+					if keepAttempts:
+						attempts.append(record)
+					if keepNodeAttempts and record.nodeId != 'None':
+						if record.nodeId not in nodeAttempts:
+							nodeAttempts[record.nodeId] = []
+						nodeAttempts[record.nodeId].append(record)
+					if nodeSlots != None and record.nodeId != 'None':
+						nodeSlots.add(record.nodeId, record)
+				elif isinstance(record, JobRecord):
+					if record.jobId in jobs:
+						job = jobs[record.jobId]
+						totalJobTime -= job.finish - job.submit
+						totalJobRunTime -= job.finish - job.start
+					jobs[record.jobId] = record
+					totalJobTime += record.finish - record.submit
+					totalJobRunTime += record.finish - record.start
+				elif isinstance(record, NodeRecord):
+					if record.nodeId not in nodes:
+						nodes[record.nodeId] = []
+					nodes[record.nodeId].append((record.time, record.status))
+			if len(jobs) > 0:
+				totalJobTime = totalJobTime/len(jobs)
+				totalJobRunTime = totalJobRunTime/len(jobs)
 
 			# Generate output HTML
 			self.fileout.write('<html>\n')
 			self.fileout.write('<head>\n')
-			self.fileout.write('<link rel="stylesheet" type="text/css" href="http://aws018:50030/static/hadoop.css">\n')
 			self.fileout.write('<title>Execution profile</title>\n')
 			self.fileout.write('</head>\n')
 			self.fileout.write('<body>\n')
@@ -243,7 +609,7 @@ class HistoryViewer:
 			self.fileout.write('    <li>Average turn-around time: %.1fs</li>\n' % totalJobTime)
 			self.fileout.write('    <li>Average runtime: %.1fs</li>\n' % totalJobRunTime)
 			self.fileout.write('  </ul>\n')
-			self.fileout.write('  <li>Attempts: %d</li>\n' % len(attempts))
+			self.fileout.write('  <li>Attempts: %d</li>\n' % nattempts)
 			self.fileout.write('</ul>\n')
 
 			# Jobs
@@ -282,29 +648,27 @@ class HistoryViewer:
 			if self.plotNodes:
 				self.fileout.write('<h1>Nodes</h1>\n')
 				self.fileout.write('<table border="0" cellspacing="0" cellpadding="0">\n')
-				for nodeId in sorted(nodeAttempts):
-					self.fileout.write('<tr><td valign="top">'+nodeId+'</td>')
+				nodeSlots.place(self.getTaskCell)
+				for nodeId in sorted(nodeSlots.getNodeIds()):
+					self.peaks[nodeId] = nodeSlots.getNumSlots(nodeId)
+					self.fileout.write('<tr><td valign="top">'+nodeId+'<br/><small>peak %d</small></td>' % self.peaks[nodeId])
 					self.fileout.write('<td>')
 					self.fileout.write('<table border="0" cellspacing="0" cellpadding="0">\n')
-					# Create slots
-					slots = []
-					for attempt in nodeAttempts[nodeId]:
-						added = False
-						for slot in slots:
-							if slot[-1].finish <= attempt.start:
-								slot.append(attempt)
-								added = True
-								break
-						if not added:
-							# Every slot is full, create a new one
-							slots.append([attempt])
 					# Draw slots
-					for slot in slots:
-						self.fileout.write('<tr><td>'+self.getTaskGraphList(slot)+'</td></tr>')
+					for slot in range(0, self.peaks[nodeId]):
+						self.fileout.write('<tr><td>')
+						self.fileout.write('<table  border="0" cellspacing="0" cellpadding="0">')
+						self.fileout.write('<tr height="5px">\n')
+						for cell in nodeSlots.getCells(nodeId, slot):
+							self.fileout.write(cell)
+						self.fileout.write("</tr>")
+						self.fileout.write("</table>\n")
+						self.fileout.write('</td></tr>')
 					self.fileout.write('</table>\n')
 					self.fileout.write('</td>')
 					self.fileout.write('</tr>')
 				self.fileout.write('</table>\n')
+				nodeSlots.close()
 
 			# Nodes ON/OFF
 			if self.plotNodesStatus:
@@ -317,3 +681,234 @@ class HistoryViewer:
 
 			self.fileout.write('</body>\n')
 			self.fileout.write('</html>\n')
+
+
+"""
+Time series of busy seconds per time bucket. It adds intervals in O(1) with a
+difference array for the buckets that an interval covers completely.
+"""
+class BucketSeries:
+	def __init__(self, bucket):
+		self.bucket = bucket
+		self.busy = array('d')
+		self.diff = array('d')
+
+	def __len__(self):
+		return len(self.busy)
+
+	def extend(self, n):
+		if n > len(self.busy):
+			self.busy.extend([0.0]*(n-len(self.busy)))
+			self.diff.extend([0.0]*(n+1-len(self.diff)))
+
+	# Add the interval [start, finish)
+	def add(self, start, finish):
+		if finish <= start:
+			return
+		first = start//self.bucket
+		last = finish//self.bucket
+		self.extend(last+1)
+		if first == last:
+			self.busy[first] += finish-start
+		else:
+			self.busy[first] += (first+1)*self.bucket - start
+			self.busy[last] +=  finish - last*self.bucket
+			self.diff[first+1] += self.bucket
+			self.diff[last] -=    self.bucket
+
+	# Average number of intervals at the same time in each bucket
+	def getValues(self, nbuckets):
+		self.extend(nbuckets)
+		ret = []
+		full = 0.0
+		for i in xrange(0, nbuckets):
+			full += self.diff[i]
+			ret.append((self.busy[i] + full)/self.bucket)
+		return ret
+
+"""
+Report that bins the attempts per node and per time bucket. It writes an SVG
+image (or a self-contained HTML page with the image) whose size depends on the
+number of nodes and buckets, not on the number of attempts.
+"""
+class BucketViewer(HistoryViewer):
+	def __init__(self, filenamein='history.log', filenameout='history.svg', bucket=60):
+		HistoryViewer.__init__(self, filenamein, filenameout)
+		self.bucket = bucket
+		# Pixels per bucket
+		self.zoom = 2
+		self.rowHeight = 10
+		self.labelWidth = 80
+		self.chartHeight = 60
+
+	def isSVG(self):
+		return self.filenameout.endswith('.svg')
+
+	# Merge consecutive buckets with the same value: (first bucket, number of buckets, value)
+	def getRuns(self, values):
+		ret = []
+		for i, value in enumerate(values):
+			if len(ret) > 0 and ret[-1][2] == value and ret[-1][0]+ret[-1][1] == i:
+				ret[-1][1] += 1
+			else:
+				ret.append([i, 1, value])
+		return ret
+
+	def getRect(self, x, y, width, height, color, opacity=1.0):
+		if opacity < 1.0:
+			return '<rect x="%d" y="%d" width="%d" height="%d" fill="%s" fill-opacity="%.1f"/>\n' % (x, y, width, height, color, opacity)
+		return '<rect x="%d" y="%d" width="%d" height="%d" fill="%s"/>\n' % (x, y, width, height, color)
+
+	def getText(self, x, y, text, anchor='start'):
+		return '<text x="%d" y="%d" text-anchor="%s">%s</text>\n' % (x, y, anchor, text)
+
+	# Row with the occupancy of a node as the opacity of each bucket
+	def getOccupancyRow(self, values, peak, y, height, color):
+		out = ''
+		if peak > 0:
+			for first, n, level in self.getRuns([int(ceil(10.0*value/peak)) for value in values]):
+				if level > 0:
+					out += self.getRect(self.labelWidth+first*self.zoom, y, n*self.zoom, height, color, min(level, 10)/10.0)
+		return out
+
+	# Row with the status of a node at the end of each bucket
+	def getStatusRow(self, statuses, nbuckets, y, height):
+		values = []
+		i = 0
+		status = None
+		for b in xrange(0, nbuckets):
+			while i < len(statuses) and statuses[i][0] < (b+1)*self.bucket:
+				status = statuses[i][1]
+				i += 1
+			values.append(status)
+		out = ''
+		for first, n, status in self.getRuns(values):
+			if status != None:
+				out += self.getRect(self.labelWidth+first*self.zoom, y, n*self.zoom, height, self.getNodeColor(status), 0.3)
+		return out
+
+	# Bar chart of a series
+	def getChart(self, values, y, height, color):
+		out = ''
+		peak = max(values) if len(values) > 0 else 0
+		if peak > 0:
+			for first, n, level in self.getRuns([int(round(height*value/peak)) for value in values]):
+				if level > 0:
+					out += self.getRect(self.labelWidth+first*self.zoom, y+height-level, n*self.zoom, level, color)
+		return out
+
+	'''
+	Generate the report from the history file.
+	'''
+	def generate(self):
+		if self.filenamein != None and self.filenameout != None:
+			# Read all the information in a single pass
+			njobs = 0
+			nattempts = 0
+			totalJobTime = 0
+			jobsRunning = BucketSeries(self.bucket)
+			jobsWaiting = BucketSeries(self.bucket)
+			mapsRunning = {} # Node -> BucketSeries
+			redsRunning = {}
+			nodes = {}
+			end = 0
+			for record in self.getRecords():
+				if isinstance(record, AttemptRecord):
+					nattempts += 1
+					if record.nodeId != 'None':
+						running = mapsRunning if record.isMap() else redsRunning
+						if record.nodeId not in running:
+							running[record.nodeId] = BucketSeries(self.bucket)
+						running[record.nodeId].add(record.start, record.finish)
+						end = max(end, record.finish)
+				elif isinstance(record, JobRecord):
+					njobs += 1
+					totalJobTime += record.finish - record.submit
+					jobsWaiting.add(record.submit, record.start)
+					jobsRunning.add(record.start, record.finish)
+					end = max(end, record.finish)
+				elif isinstance(record, NodeRecord):
+					if record.nodeId not in nodes:
+						nodes[record.nodeId] = []
+					nodes[record.nodeId].append((record.time, record.status))
+					end = max(end, record.time)
+			nbuckets = end//self.bucket + 1
+			nodeIds = sorted(set(nodes.keys()) | set(mapsRunning.keys()) | set(redsRunning.keys()))
+
+			# Occupancy per node
+			maps = {}
+			reds = {}
+			for nodeId in nodeIds:
+				maps[nodeId] = mapsRunning[nodeId].getValues(nbuckets) if nodeId in mapsRunning else []
+				reds[nodeId] = redsRunning[nodeId].getValues(nbuckets) if nodeId in redsRunning else []
+			peakMaps = max([max(values) for values in maps.values() if len(values) > 0] or [0])
+			peakReds = max([max(values) for values in reds.values() if len(values) > 0] or [0])
+
+			# Layout
+			width = self.labelWidth + nbuckets*self.zoom
+			top = 40
+			height = top + 2*(self.chartHeight+20) + len(nodeIds)*(2*self.rowHeight+2) + 20
+
+			# Generate output
+			if not self.isSVG():
+				self.fileout.write('<html>\n')
+				self.fileout.write('<head>\n')
+				self.fileout.write('<title>Execution profile</title>\n')
+				self.fileout.write('</head>\n')
+				self.fileout.write('<body>\n')
+			self.fileout.write('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" font-family="sans-serif" font-size="10">\n' % (width, height))
+			self.fileout.write('<rect width="100%" height="100%" fill="white"/>\n')
+
+			# Summary
+			summary = 'Jobs: %d' % njobs
+			if njobs > 0:
+				summary += ' (average turn-around time: %.1fs)' % (1.0*totalJobTime/njobs)
+			summary += ' Attempts: %d Bucket: %s' % (nattempts, timeStr(self.bucket))
+			self.fileout.write(self.getText(0, 15, summary))
+			self.fileout.write(self.getText(self.labelWidth, 30, '0s'))
+			self.fileout.write(self.getText(width, 30, timeStr(nbuckets*self.bucket), 'end'))
+
+			# Jobs
+			y = top
+			self.fileout.write(self.getText(0, y+self.chartHeight, 'Jobs running'))
+			self.fileout.write(self.getChart(jobsRunning.getValues(nbuckets), y, self.chartHeight, '#00FF00'))
+			y += self.chartHeight + 20
+			self.fileout.write(self.getText(0, y+self.chartHeight, 'Jobs waiting'))
+			self.fileout.write(self.getChart(jobsWaiting.getValues(nbuckets), y, self.chartHeight, '#0000FF'))
+			y += self.chartHeight + 20
+
+			# Nodes: status, maps and reduces running
+			for nodeId in nodeIds:
+				self.fileout.write(self.getText(0, y+2*self.rowHeight-2, nodeId))
+				if nodeId in nodes:
+					self.fileout.write(self.getStatusRow(nodes[nodeId], nbuckets, y, 2*self.rowHeight))
+				self.fileout.write(self.getOccupancyRow(maps[nodeId], peakMaps, y,                self.rowHeight, '#000080'))
+				self.fileout.write(self.getOccupancyRow(reds[nodeId], peakReds, y+self.rowHeight, self.rowHeight, '#800000'))
+				y += 2*self.rowHeight + 2
+
+			self.fileout.write('</svg>\n')
+			if not self.isSVG():
+				self.fileout.write('</body>\n')
+				self.fileout.write('</html>\n')
+
+
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog [options] history")
+	parser.add_option('-t', "--text",                       dest="text",      type="string", default=None,  help="convert a binary history into this text history")
+	parser.add_option('-o', "--out",                        dest="out",       type="string", default=None,  help="generate the HTML report into this file")
+	parser.add_option('-s', "--svg",                        dest="svg",       type="string", default=None,  help="generate the report by time buckets into this file (.svg or .html)")
+	parser.add_option('-b', "--bucket",                     dest="bucket",    type="int",    default=60,    help="seconds per time bucket")
+	parser.add_option('-z', "--zoom",                       dest="zoom",      type="int",    default=2,     help="pixels per time bucket")
+	(options, args) = parser.parse_args()
+	if len(args) != 1:
+		parser.error('specify a history file')
+
+	if options.text != None:
+		convertHistory(args[0], options.text)
+	if options.out != None:
+		viewer = HistoryViewer(args[0], options.out)
+		viewer.generate()
+	if options.svg != None:
+		viewer = BucketViewer(args[0], options.svg, options.bucket)
+		viewer.zoom = options.zoom
+		viewer.generate()
@@ -2,6 +2,8 @@
 
 from commons import isRealistic
 
+from collections import deque
+
 import random
 if not isRealistic():
 	random.seed(0)
@@ -11,18 +13,42 @@ class ID:
 	def getId(id):
 		return int(id.split('_')[-1])
 
+	# task_<tracker>_<job>_<m|r>_<index>
+	@staticmethod
+	def getTaskId(jobId, taskType, index):
+		return '%s_%s_%06d' % (jobId.replace('job_', 'task_', 1), Task.Type.toString[taskType], index)
+
+	# attempt_<tracker>_<job>_<m|r>_<index>_<number>
+	@staticmethod
+	def getAttemptId(taskId, number):
+		return '%s_%d' % (taskId.replace('task_', 'attempt_', 1), number)
+
 """
 Represents a Hadoop attempt.
 """
-class Attempt:
-	def __init__(self, attemptId=None, task=None, seconds=10):
+class Attempt(object):
+	def __init__(self, attemptId=None, task=None, seconds=10, number=None):
 		self.task = task
-		self.attemptId = attemptId
+		self.number = number # Attempt number within the task
+		self.taskType = task.taskType if task != None else None
+		self.strId = attemptId # Only for attempts read from a history
 		self.nodeId = None
 		self.start = None
 		self.finish = None
 		self.status = Job.Status.QUEUED
 		self.seconds = seconds # Remaining seconds
+		self.copied = 0.0 # MB of map output copied (reduces)
+
+	# The id string is only built when needed (e.g., writing the history)
+	def getAttemptId(self):
+		if self.strId != None or self.task == None:
+			return self.strId
+		return ID.getAttemptId(self.task.taskId, self.number)
+
+	def setAttemptId(self, attemptId):
+		self.strId = attemptId
+
+	attemptId = property(getAttemptId, setAttemptId)
 
 	def progress(self, p):
 		self.seconds -= p
@@ -30,26 +56,46 @@ class Attempt:
 	def isCompleted(self):
 		return self.seconds <= 0
 
+	# Reduces: copy the output of the finished maps (shuffle)
+	def shuffle(self, mb):
+		job = self.getJob()
+		self.copied = min(self.copied + mb, job.cmaps*job.getReduceInput())
+
+	# Reduces: check if the shuffle finished and the reduce can progress
+	def isShuffled(self):
+		job = self.getJob()
+		return job.isMapCompleted() and self.copied >= len(job.maps)*job.getReduceInput()
+
 	def getJobId(self):
+		if self.task != None and self.task.job != None:
+			return self.task.job.jobId
 		return '_'.join(self.attemptId.split('_')[0:3]).replace('attempt_', 'job_')
 
 	def getTaskId(self):
+		if self.task != None:
+			return self.task.taskId
 		return self.attemptId[:self.attemptId.rfind('_')].replace('attempt_', 'task_')
 
 	def getId(self):
+		if self.task != None and self.task.index != None:
+			return self.task.index
 		return int(self.attemptId.split('_')[4])
 
 	def isMap(self):
+		if self.taskType != None:
+			return self.taskType == Task.Type.MAP
 		return self.attemptId.rfind('_m_') >= 0
 
 	def isRed(self):
+		if self.taskType != None:
+			return self.taskType == Task.Type.RED
 		return self.attemptId.rfind('_r_') >= 0
 
 	def getTask(self):
 		return self.task
 
 	def getJob(self):
-		return self.getTask().getJob()
+		return self.task.job
 
 	def __str__(self):
 		return self.attemptId
@@ -57,16 +103,35 @@ class Attempt:
 """
 Represents a Hadoop task.
 """
-class Task:
-	def __init__(self, taskId=None, job=None, length=None, gauss=None):
+class Task(object):
+	# Task types
+	class Type:
+		MAP = 0
+		RED = 1
+		toString = {MAP:'m', RED:'r'}
+
+	def __init__(self, taskId=None, job=None, length=None, gauss=None, taskType=None, index=None):
 		self.job = job
-		self.taskId = taskId
+		self.taskType = taskType
+		self.index = index # Task number within the job
+		self.strId = taskId # Only for tasks read from a history
 		self.length = length
 		self.gauss = gauss # Task length distribution in %
-		self.attempts = {}
+		self.attempts = {} # Attempt number -> Attempt
 		self.nattempts = 0
 		self.status = Job.Status.QUEUED # Status: QUEUED -> RUNNING -> SUCCEEDED | DROPPED
 
+	# The id string is only built when needed (e.g., writing the history)
+	def getTaskId(self):
+		if self.strId != None or self.job == None:
+			return self.strId
+		return ID.getTaskId(self.job.jobId, self.taskType, self.index)
+
+	def setTaskId(self, taskId):
+		self.strId = taskId
+
+	taskId = property(getTaskId, setTaskId)
+
 	def isQueued(self):
 		if len(self.attempts) == 0:
 			return True
@@ -77,23 +142,31 @@ class Task:
 		return False
 
 	def isMap(self):
+		if self.taskType != None:
+			return self.taskType == Task.Type.MAP
 		return self.taskId.rfind('_m_') >= 0
 
 	def isRed(self):
+		if self.taskType != None:
+			return self.taskType == Task.Type.RED
 		return self.taskId.rfind('_r_') >= 0
 
+	# Length of a new attempt of this task
+	def getAttemptLength(self):
+		seconds = self.length
+		if self.gauss != None: #random.gauss(mu, sigma) mean  standard deviation
+			rng = self.job.random if self.job != None else random
+			seconds = int(rng.gauss(seconds, self.gauss/100.0*seconds))
+			# Minimum task length
+			if seconds < 3:
+				seconds = 3
+		return seconds
+
 	def getAttempt(self):
 		if len(self.attempts) == 0:
 			self.nattempts += 1
-			attemptId = (self.taskId+'_%d' % self.nattempts).replace('task_', 'attempt_')
-			seconds = self.length
-			if self.gauss != None: #random.gauss(mu, sigma) mean  standard deviation
-				seconds = int(random.gauss(seconds, self.gauss/100.0*seconds))
-				# Minimum task length
-				if seconds < 3:
-					seconds = 3
-			attempt = Attempt(attemptId=attemptId, task=self, seconds=seconds)
-			self.attempts[attempt.attemptId] = attempt
+			attempt = Attempt(task=self, seconds=self.getAttemptLength(), number=self.nattempts)
+			self.attempts[attempt.number] = attempt
 			return attempt
 		else:
 			for attempt in self.attempts.values():
@@ -101,6 +174,10 @@ class Task:
 					return attempt
 		return None
 
+	# Mark the task as completed by one of its attempts
+	def complete(self, attempt):
+		self.status = Job.Status.SUCCEEDED
+
 	def getJob(self):
 		return self.job
 
@@ -132,13 +209,38 @@ class Job:
 		self.lred = lred
 		self.gauss = 20
 		self.submit = submit # Submission time
+		self.start = None    # Start time
 		self.finish = None   # Finish time
 
 		self.priority = Job.Priority.NORMAL
+		# Pool/queue of the fair and capacity schedulers (None: by priority or default)
+		self.pool = None
+		# Fraction of the maps that finish before the reduces start (slow start)
+		self.slowstart = 1.0
+		# MB of output per map, split between the reduces (shuffle)
+		self.mapOutput = 0.0
+
+		# Random generator for the task lengths (the simulator sets its own)
+		self.random = random
+
+		# Store the tasks in typed arrays (see taskstore)
+		self.compact = False
 
 		# Set queue execution state
 		self.reset()
 
+	# The random module cannot be pickled (checkpoints)
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		if state.get('random') is random:
+			del state['random']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		if 'random' not in state:
+			self.random = random
+
 	'''
 	Reset the job running
 	'''
@@ -148,52 +250,73 @@ class Job:
 		# Reset Tasks
 		self.cmaps = 0
 		self.creds = 0
+		self.hasTasks = False
 		self.maps = {}
 		self.reds = {}
+		# Tasks waiting for a slot (FIFO of task ids)
+		self.pendingMaps = deque()
+		self.pendingReds = deque()
+		# Pending maps started out of order (see getMapTaskAt)
+		self.mapsTaken = set()
 
+	'''
+	Create the tasks. The simulator does it when the job reaches its submission time.
+	'''
 	def initTasks(self):
+		self.hasTasks = True
+		if self.compact:
+			self.initCompactTasks()
+			return
 		# Maps
 		# Initialize tasks
-		for nmap in range(0, self.nmaps):
-			taskId = '%s_m_%06d' % (self.jobId.replace('job_', 'task_'), nmap+1)
-			self.maps[taskId] = Task(taskId, self, self.lmap)
-			self.maps[taskId].gauss = self.gauss
+		for nmap in range(1, self.nmaps+1):
+			self.maps[nmap] = Task(job=self, length=self.lmap, gauss=self.gauss, taskType=Task.Type.MAP, index=nmap)
+			self.pendingMaps.append(nmap)
 
 		# Reduces
 		# Initialize tasks
-		for nred in range(0, self.nreds):
-			taskId = '%s_r_%06d' % (self.jobId.replace('job_', 'task_'), nred+1)
-			self.reds[taskId] = Task(taskId, self, self.lred)
-			self.reds[taskId].gauss = self.gauss
+		for nred in range(1, self.nreds+1):
+			self.reds[nred] = Task(job=self, length=self.lred, gauss=self.gauss, taskType=Task.Type.RED, index=nred)
+			self.pendingReds.append(nred)
+
+	def initCompactTasks(self):
+		from taskstore import TaskArray, TaskRange
+		self.maps = TaskArray(self, Task.Type.MAP, self.nmaps, self.lmap, self.gauss)
+		self.reds = TaskArray(self, Task.Type.RED, self.nreds, self.lred, self.gauss)
+		self.pendingMaps = TaskRange(1, self.nmaps)
+		self.pendingReds = TaskRange(1, self.nreds)
 
 	def getMapTask(self):
-		for mapTask in self.maps.values():
-			if mapTask.isQueued():
-				return mapTask.getAttempt()
+		while len(self.pendingMaps) > 0:
+			index = self.pendingMaps.popleft()
+			if index in self.mapsTaken:
+				self.mapsTaken.remove(index)
+				continue
+			return self.maps[index].getAttempt()
 		return None
 
+	# Get a specific queued map (e.g., with local data). It leaves the queue lazily.
+	def getMapTaskAt(self, index):
+		self.mapsTaken.add(index)
+		return self.maps[index].getAttempt()
+
+	# Check if a map has not started yet
+	def isMapQueued(self, index):
+		return self.maps[index].nattempts == 0
+
 	def getRedTask(self):
-		# Wait for the maps to finish. TODO slow start
-		if self.cmaps >= len(self.maps):
-			for redTask in self.reds.values():
-				if redTask.isQueued():
-					return redTask.getAttempt()
+		# Wait for some maps to finish (slow start)
+		if self.isRedReady() and len(self.pendingReds) > 0:
+			return self.reds[self.pendingReds.popleft()].getAttempt()
 		return None
 
 	def mapQueued(self):
-		ret = 0
-		for mapTask in self.maps.values():
-			if mapTask.isQueued():
-				ret += 1
-		return ret
+		return len(self.pendingMaps) - len(self.mapsTaken)
 
 	def redQueued(self):
-		ret = 0
-		if self.isMapCompleted():
-			for redTask in self.reds.values():
-				if redTask.isQueued():
-					ret += 1
-		return ret
+		if self.isRedReady():
+			return len(self.pendingReds)
+		return 0
 
 	def getStart(self):
 		start = None
@@ -201,6 +324,9 @@ class Job:
 			for attempt in task.attempts.values():
 				if start == None or start > attempt.start:
 					start = attempt.start
+		# Tasks already released
+		if start == None:
+			return self.start
 		return start
 
 	def getFinish(self):
@@ -209,12 +335,37 @@ class Job:
 			for attempt in task.attempts.values():
 				if finish == None or finish < attempt.finish:
 					finish = attempt.finish
+		# Tasks already released
+		if finish == None:
+			return self.finish
 		return finish
 
+	'''
+	Free the tasks of a finished job keeping its start and finish times.
+	'''
+	def releaseTasks(self):
+		self.start = self.getStart()
+		self.finish = self.getFinish()
+		self.maps = {}
+		self.reds = {}
+		self.pendingMaps = deque()
+		self.pendingReds = deque()
+		self.mapsTaken = set()
+
 	# Check if all the maps are completed
 	def isMapCompleted(self):
 		return self.cmaps >= len(self.maps)
 
+	# Check if enough maps are completed to start the reduces
+	def isRedReady(self):
+		return self.cmaps >= self.slowstart*len(self.maps)
+
+	# MB of output of each map for each reduce (multiple of 1/1024 so the shuffle is exact)
+	def getReduceInput(self):
+		if self.nreds > 0:
+			return round(self.mapOutput/self.nreds*1024)/1024.0
+		return 0.0
+
 	# Check if the job is running
 	def isRunning(self):
 		return self.cmaps < len(self.maps) or self.creds < len(self.reds)
@@ -231,18 +382,13 @@ class Job:
 	# Complete an attempt
 	def completeAttempt(self, attempt):
 		ret = []
+		attempt.task.complete(attempt)
 		# Map
-		if attempt.isMap():
-			for mapTask in self.maps.values():
-				if mapTask.taskId == attempt.getTaskId():
-					mapTask.status = Job.Status.SUCCEEDED
-					self.cmaps += 1
+		if attempt.taskType == Task.Type.MAP:
+			self.cmaps += 1
 		# Reduce
 		else:
-			for redTask in self.reds.values():
-				if redTask.taskId == attempt.getTaskId():
-					redTask.status = Job.Status.SUCCEEDED
-					self.creds += 1
+			self.creds += 1
 			if self.creds >= len(self.reds):
 				ret.append(self)
 		return ret
@@ -250,12 +396,12 @@ class Job:
 	# Add an attempt to the job
 	def addAttempt(self, attempt):
 		taskId = attempt.getTaskId()
+		index = ID.getId(taskId)
 		if attempt.isMap():
-			if taskId not in self.maps:
-				self.maps[taskId] = Task(taskId)
-			self.maps[taskId].attempts[attempt.attemptId] = attempt
+			if index not in self.maps:
+				self.maps[index] = Task(taskId, self, taskType=Task.Type.MAP, index=index)
+			self.maps[index].attempts[ID.getId(attempt.attemptId)] = attempt
 		if attempt.isRed():
-			if taskId not in self.reds:
-				self.reds[taskId] = Task(taskId)
-			self.reds[taskId].attempts[attempt.attemptId] = attempt
-
+			if index not in self.reds:
+				self.reds[index] = Task(taskId, self, taskType=Task.Type.RED, index=index)
+			self.reds[index].attempts[ID.getId(attempt.attemptId)] = attempt
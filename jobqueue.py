@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import heapq
+
+"""
+Priority queue of job ids ordered by a sort key.
+Jobs with the same key keep their insertion order. The jobs added at the end
+get their key and go into the heap when the order is needed (adding a job costs
+O(1) and a queue that is never walked never computes the keys).
+"""
+class JobQueue:
+	def __init__(self, key):
+		self.key = key
+		self.heap = [] # (key, seq, jobId)
+		self.entries = {} # jobId -> heap entry (None while pending)
+		self.pending = {} # jobId -> seq of the jobs not in the heap yet
+		self.seq = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	# The key is usually a method of the simulator: the owner sets it again after unpickling
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['key'] = None
+		return state
+
+	def __contains__(self, jobId):
+		return jobId in self.entries
+
+	# Add a job (at the end of the jobs with its key unless it gives its position seq)
+	def add(self, jobId, seq=None):
+		if jobId in self.entries:
+			self.remove(jobId)
+		if seq == None:
+			self.seq += 1
+			seq = self.seq
+		self.entries[jobId] = None
+		self.pending[jobId] = seq
+
+	# Put the pending jobs into the heap (in linear time if they are many)
+	def flush(self):
+		if len(self.pending) == 0:
+			return
+		entries = [(self.key(jobId), seq, jobId) for jobId, seq in self.pending.iteritems()]
+		self.entries.update((entry[2], entry) for entry in entries)
+		self.pending = {}
+		if len(entries) > len(self.heap):
+			self.heap += entries
+			heapq.heapify(self.heap)
+		else:
+			for entry in entries:
+				heapq.heappush(self.heap, entry)
+
+	# Move a job after its key changes (it keeps its position among the jobs with the same key)
+	def update(self, jobId):
+		self.flush()
+		self.add(jobId, self.entries[jobId][1])
+
+	'''
+	Remove a job. The heap entry is dropped lazily.
+	'''
+	def remove(self, jobId):
+		del self.entries[jobId]
+		self.pending.pop(jobId, None)
+		# Rebuild the heap when it is mostly removed entries
+		if len(self.heap) > 2*len(self.entries) + 64:
+			self.heap = [entry for entry in self.heap if self.isValid(entry)]
+			heapq.heapify(self.heap)
+
+	# Sort again with new keys (e.g., the scheduling policy changed). Ties keep the insertion order.
+	def rekey(self):
+		self.flush()
+		for jobId, entry in self.entries.items():
+			self.entries[jobId] = (self.key(jobId), entry[1], jobId)
+		self.heap = self.entries.values()
+		heapq.heapify(self.heap)
+
+	# The entries of removed or moved jobs stay in the heap until they reach the top
+	def isValid(self, entry):
+		return self.entries.get(entry[2]) is entry
+
+	# First job in the queue
+	def first(self):
+		self.flush()
+		while len(self.heap) > 0 and not self.isValid(self.heap[0]):
+			heapq.heappop(self.heap)
+		if len(self.heap) > 0:
+			return self.heap[0][2]
+		return None
+
+	'''
+	Walk the jobs in order without modifying the heap (it only drops the removed jobs at the top first):
+	getting the first k jobs costs O(k log k). The queue cannot change during the walk.
+	'''
+	def __iter__(self):
+		self.first()
+		heap = self.heap
+		if len(heap) == 0:
+			return
+		frontier = [(heap[0], 0)]
+		while len(frontier) > 0:
+			entry, i = heapq.heappop(frontier)
+			if self.isValid(entry):
+				yield entry[2]
+			for child in (2*i+1, 2*i+2):
+				if child < len(heap):
+					heapq.heappush(frontier, (heap[child], child))
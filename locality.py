@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+from collections import deque
+
+import random
+
+from job import Task
+
+'''
+Data locality of the maps.
+Every job stores the input block of each map in HDFS with a replication factor
+(first replica in a random node, second in another rack and third in the rack of
+the second). A map runs longer when its block is not in the node (rack-local) or
+not in the rack (remote). The queued maps are indexed by the nodes and racks
+that store their blocks, so a node finds its local maps without scanning them.
+The jobs without local maps for a node wait a few seconds before running
+rack-local or remote maps (delay scheduling).
+'''
+
+"""
+Places the blocks of the jobs and picks the maps for a node with free slots.
+"""
+class Locality:
+	# Locality levels
+	class Level:
+		NODE   = 0
+		RACK   = 1
+		REMOTE = 2
+		toString = {NODE:'node-local', RACK:'rack-local', REMOTE:'remote'}
+
+	def __init__(self, simulator, replication=3, rackSize=20, seed=None):
+		self.simulator = simulator
+		self.replication = replication
+		self.rackSize = rackSize
+		# Random generator of the placement (the task lengths keep theirs)
+		self.random = random.Random(seed if seed != None else 0)
+		# Runtime multiplier of the maps per level
+		self.factors = {Locality.Level.NODE: 1.0, Locality.Level.RACK: 1.2, Locality.Level.REMOTE: 1.5}
+		# Seconds a job waits for a node-local map and then for a rack-local map
+		self.nodeDelay = 5
+		self.rackDelay = 5
+		# Racks: node id -> rack and rack -> node ids
+		self.nodeIds = []
+		self.racks = {}
+		self.rackNodes = {}
+		# Queued maps with a block in a node/rack: node id/rack -> job id -> map indices (may contain started maps)
+		self.nodeMaps = {}
+		self.rackMaps = {}
+		# Nodes and racks that store blocks of each job
+		self.jobNodes = {}
+		self.jobRacks = {}
+		# Time since each job waits for a local map (since its last node-local map)
+		self.waitStart = {}
+		# Next time a waiting job accepts a worse level (for the event engine)
+		self.wakeup = None
+		# Maps started per level
+		self.launched = dict((level, 0) for level in Locality.Level.toString)
+
+	# Assign the nodes without a rack: rackSize consecutive nodes (by id) per rack
+	def updateRacks(self):
+		self.nodeIds = sorted(self.simulator.nodes)
+		for i, nodeId in enumerate(self.nodeIds):
+			if nodeId not in self.racks:
+				rack = self.simulator.nodes[nodeId].rack
+				if rack == None:
+					rack = 'rack%03d' % (i/self.rackSize)
+				self.racks[nodeId] = rack
+				if rack not in self.rackNodes:
+					self.rackNodes[rack] = []
+				self.rackNodes[rack].append(nodeId)
+
+	# Nodes that store the replicas of a block
+	def getReplicas(self):
+		replication = min(self.replication, len(self.nodeIds))
+		ret = [self.random.choice(self.nodeIds)]
+		# Second replica in another rack, third in the same rack as the second
+		if replication > 1 and len(self.rackNodes) > 1:
+			second = self.getNode(self.nodeIds, lambda nodeId: self.racks[nodeId] != self.racks[ret[0]])
+			ret.append(second)
+			rack = self.rackNodes[self.racks[second]]
+			if replication > 2 and len(rack) > 1:
+				ret.append(self.getNode(rack, lambda nodeId: nodeId != second))
+		# The rest anywhere
+		while len(ret) < replication:
+			ret.append(self.getNode(self.nodeIds, lambda nodeId: nodeId not in ret))
+		return ret
+
+	# Random node that meets a condition (there must be one)
+	def getNode(self, nodeIds, condition):
+		while True:
+			nodeId = self.random.choice(nodeIds)
+			if condition(nodeId):
+				return nodeId
+
+	'''
+	Place the blocks of a job when it is submitted and index its maps.
+	'''
+	def addJob(self, job):
+		if len(self.racks) != len(self.simulator.nodes):
+			self.updateRacks()
+		nodes = set()
+		racks = set()
+		for index in range(1, job.nmaps+1):
+			replicas = self.getReplicas()
+			for nodeId in replicas:
+				Locality.addMap(self.nodeMaps, nodeId, job.jobId, index)
+			for rack in set(self.racks[nodeId] for nodeId in replicas):
+				Locality.addMap(self.rackMaps, rack, job.jobId, index)
+				racks.add(rack)
+			nodes.update(replicas)
+		self.jobNodes[job.jobId] = nodes
+		self.jobRacks[job.jobId] = racks
+
+	@staticmethod
+	def addMap(maps, key, jobId, index):
+		if key not in maps:
+			maps[key] = {}
+		if jobId not in maps[key]:
+			maps[key][jobId] = deque()
+		maps[key][jobId].append(index)
+
+	# Remove a finished job from the index
+	def removeJob(self, job):
+		for nodeId in self.jobNodes.pop(job.jobId, ()):
+			self.nodeMaps[nodeId].pop(job.jobId, None)
+		for rack in self.jobRacks.pop(job.jobId, ()):
+			self.rackMaps[rack].pop(job.jobId, None)
+		self.waitStart.pop(job.jobId, None)
+
+	# Take a queued map of a job stored in a node/rack (the maps started elsewhere are dropped)
+	@staticmethod
+	def popMap(maps, key, job):
+		jobMaps = maps.get(key)
+		if jobMaps == None or job.jobId not in jobMaps:
+			return None
+		indices = jobMaps[job.jobId]
+		while len(indices) > 0:
+			index = indices.popleft()
+			if job.isMapQueued(index):
+				return index
+		del jobMaps[job.jobId]
+		return None
+
+	# Worst level a job accepts now
+	def getLevel(self, jobId):
+		if jobId not in self.waitStart:
+			return Locality.Level.NODE
+		wait = self.simulator.t - self.waitStart[jobId]
+		if wait < self.nodeDelay:
+			return Locality.Level.NODE
+		elif wait < self.nodeDelay + self.rackDelay:
+			return Locality.Level.RACK
+		return Locality.Level.REMOTE
+
+	# The job skips a node: it waits until it accepts a worse level
+	def skip(self, jobId, level):
+		if jobId not in self.waitStart:
+			self.waitStart[jobId] = self.simulator.t
+		wakeup = self.waitStart[jobId] + self.nodeDelay
+		if level == Locality.Level.RACK:
+			wakeup += self.rackDelay
+		self.setWakeup(wakeup)
+
+	def setWakeup(self, wakeup):
+		if self.wakeup == None or self.wakeup > wakeup:
+			self.wakeup = wakeup
+
+	'''
+	Get a queued map for a node: the first job (in scheduling order) with a map
+	at a level it accepts. The length of the attempt depends on the level.
+	'''
+	def getMapTask(self, node):
+		simulator = self.simulator
+		rack = self.racks.get(node.nodeId)
+		for jobId in simulator.scheduler.getJobs(Task.Type.MAP):
+			job = simulator.jobs[jobId]
+			if job.mapQueued() == 0:
+				continue
+			level = self.getLevel(jobId)
+			index = Locality.popMap(self.nodeMaps, node.nodeId, job)
+			if index != None:
+				# A local map restarts the wait
+				self.waitStart[jobId] = simulator.t
+				self.setWakeup(simulator.t + self.nodeDelay)
+				return self.launch(job.getMapTaskAt(index), Locality.Level.NODE)
+			index = Locality.popMap(self.rackMaps, rack, job) if level >= Locality.Level.RACK else None
+			if index != None:
+				return self.launch(job.getMapTaskAt(index), Locality.Level.RACK)
+			if level >= Locality.Level.REMOTE:
+				return self.launch(job.getMapTask(), Locality.Level.REMOTE)
+			self.skip(jobId, level)
+		return None
+
+	def launch(self, attempt, level):
+		attempt.locality = level
+		attempt.seconds = int(round(attempt.seconds*self.factors[level]))
+		self.launched[level] += 1
+		return attempt
+
+	# Percentage of the maps started at each level
+	def getReport(self):
+		total = sum(self.launched.values())
+		ret = []
+		for level in sorted(Locality.Level.toString):
+			ret.append('%.1f%% %s' % (100.0*self.launched[level]/total if total > 0 else 0.0, Locality.Level.toString[level]))
+		return ' '.join(ret)
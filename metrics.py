@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+from array import array
+
+import struct
+import sys
+
+'''
+Time series of the cluster state during a simulation.
+The simulator keeps running totals of the slots and nodes in its SlotPool, so a
+sample costs O(1) and does not scan the nodes.
+'''
+
+"""
+Records the cluster metrics every interval seconds into preallocated arrays.
+"""
+class MetricsRecorder:
+	COLUMNS = ('time', 'utilization', 'nodes', 'mapsRunning', 'redsRunning', 'mapsQueued', 'redsQueued', 'jobs')
+
+	def __init__(self, interval=60, capacity=1024):
+		self.interval = interval
+		self.nextTime = 0
+		self.size = 0
+		self.columns = [array('d', [0.0])*capacity for column in MetricsRecorder.COLUMNS]
+
+	def __len__(self):
+		return self.size
+
+	# Double the arrays when they are full
+	def grow(self):
+		for values in self.columns:
+			values.extend(values)
+
+	def add(self, values):
+		if self.size == len(self.columns[0]):
+			self.grow()
+		for column, value in zip(self.columns, values):
+			column[self.size] = value
+		self.size += 1
+
+	'''
+	Record the current state of the simulator for every sample time before t.
+	The state does not change between the times the simulator processes.
+	'''
+	def record(self, simulator, t):
+		if self.nextTime < t:
+			pool = simulator.getPool()
+			values = [0, pool.getUtilization(), pool.nodesOn, pool.mapsRunning, pool.redsRunning, simulator.mapsPending, simulator.redsPending, len(simulator.jobsSubmitted)]
+			while self.nextTime < t:
+				values[0] = self.nextTime
+				self.add(values)
+				self.nextTime += self.interval
+
+	# Values of a metric
+	def getSeries(self, name):
+		return self.columns[MetricsRecorder.COLUMNS.index(name)][:self.size]
+
+	def save(self, filename):
+		if filename.endswith('.npy'):
+			self.saveNpy(filename)
+		else:
+			self.saveCSV(filename)
+
+	def saveCSV(self, filename):
+		with open(filename, 'w') as f:
+			f.write(','.join(MetricsRecorder.COLUMNS) + '\n')
+			for i in xrange(0, self.size):
+				f.write(','.join(MetricsRecorder.formatValue(values[i]) for values in self.columns) + '\n')
+
+	# Exact text of a value: integers (times, counts) without decimals, floats with all their digits
+	@staticmethod
+	def formatValue(value):
+		if value.is_integer():
+			return '%d' % value
+		return repr(value)
+
+	'''
+	Save as a NumPy array (samples x columns of float64) without requiring NumPy.
+	'''
+	def saveNpy(self, filename):
+		header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (self.size, len(self.columns))
+		# Magic, version and header padded to 16 bytes
+		header += ' '*(15 - (10 + len(header)) % 16) + '\n'
+		data = array('d', [0.0])*(self.size*len(self.columns))
+		for j, values in enumerate(self.columns):
+			data[j::len(self.columns)] = values[:self.size]
+		if sys.byteorder == 'big':
+			data.byteswap()
+		with open(filename, 'wb') as f:
+			f.write('\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header)
+			f.write(data.tostring())
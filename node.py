@@ -15,6 +15,18 @@ class Node:
 		# Slots
 		self.numMaps = 3
 		self.numReds = 1
+		# Seconds of work per second (multiple of 1/1024, see cluster)
+		self.speed = 1.0
+		# Rack (None: assigned by the locality model)
+		self.rack = None
+		# Network bandwidth in MB/s (shared by the reduce slots in the shuffle)
+		self.bandwidth = 128.0
+
+		# Free slot pool that tracks this node
+		self.pool = None
+
+		# The node stores data that must stay available (it cannot sleep)
+		self.covering = False
 
 	'''
 	Progress the execution of the node for a cycle.
@@ -26,33 +38,61 @@ class Node:
 		# Progress the execution of the tasks in this node
 		# Maps
 		for mapAttempt in list(self.maps):
-			mapAttempt.progress(p)
+			mapAttempt.progress(p*self.speed)
 			# Check if the map is completed
 			if mapAttempt.isCompleted():
 				self.maps.remove(mapAttempt)
 				ret.append(mapAttempt)
 		# Reduces
 		for redAttempt in list(self.reds):
-			# Check if the maps of this node are completed
-			if redAttempt.getJob().isMapCompleted():
-				redAttempt.progress(p)
+			# Copy the output of the maps and reduce when all of them are copied
+			if redAttempt.isShuffled():
+				redAttempt.progress(p*self.speed)
+			else:
+				redAttempt.shuffle(p*self.getShuffleRate())
 			# Check if the reduce is completed
 			if redAttempt.isCompleted():
 				self.reds.remove(redAttempt)
 				ret.append(redAttempt)
+		if len(ret) > 0:
+			self.updatePool()
 		return ret
 
+	# MB/s each reduce copies (multiple of 1/1024 so the shuffle is exact)
+	def getShuffleRate(self):
+		return round(1.0*self.bandwidth/max(1, self.numReds)*1024)/1024.0
+
 	# Start running a map attempt
 	def assignMap(self, attempt):
 		self.maps.append(attempt)
 		attempt.status = 'RUNNING'
 		attempt.nodeId = self.nodeId
+		self.updatePool()
 
 	# Start running a reduce attempt
 	def assignRed(self, attempt):
 		self.reds.append(attempt)
 		attempt.status = 'RUNNING'
 		attempt.nodeId = self.nodeId
+		self.updatePool()
+
+	# Stop running an attempt
+	def removeAttempt(self, attempt):
+		if attempt.isMap():
+			self.maps.remove(attempt)
+		else:
+			self.reds.remove(attempt)
+		self.updatePool()
+
+	# Change the power status of the node
+	def setStatus(self, status):
+		self.status = status
+		self.updatePool()
+
+	# Report the free slots to the pool
+	def updatePool(self):
+		if self.pool != None:
+			self.pool.update(self)
 
 	# Check if the node is running an attempt
 	def isRunning(self):
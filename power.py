@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import heapq
+
+'''
+Node power management.
+Idle nodes that are not required go to sleep and sleeping nodes wake up when
+there is queued work: ON -> SLEEPING-X -> SLEEP -> WAKING-X -> ON (X is the
+duration of the transition in seconds). The transitions and the idle timers are
+deadlines in a heap, so the nodes are not scanned every step.
+'''
+
+"""
+Puts the nodes of a simulator to sleep and wakes them up. It also accounts the energy per state.
+"""
+class PowerManager:
+	# Power in W of a node in each state
+	POWER = {'ON': 150.0, 'SLEEPING': 150.0, 'SLEEP': 10.0, 'WAKING': 150.0, 'OFF': 0.0}
+
+	def __init__(self, simulator):
+		self.simulator = simulator
+		# Seconds to go to sleep, to wake up and idle before going to sleep
+		self.sleepTime = 10
+		self.wakeTime = 30
+		self.idleTime = 60
+		# Deadlines: (time, seq, node id, version). A deadline is valid while the version of the node does not change.
+		self.deadlines = []
+		self.seq = 0
+		self.versions = {}
+		# Nodes in SLEEP (heap of node ids, may contain stale entries)
+		self.sleeping = []
+		# Nodes waking up and the slots they bring
+		self.waking = set()
+		self.wakingMaps = 0
+		self.wakingReds = 0
+		# Nodes to check after the assignment
+		self.candidates = set()
+		# Energy in J per state and time of the last change of each node
+		self.energy = dict((state, 0.0) for state in PowerManager.POWER)
+		self.since = {}
+		for nodeId in simulator.nodes:
+			self.addNode(simulator.nodes[nodeId])
+
+	def addNode(self, node):
+		self.versions[node.nodeId] = 0
+		self.since[node.nodeId] = self.simulator.t
+		self.candidates.add(node.nodeId)
+
+	@staticmethod
+	def getState(status):
+		return status.split('-')[0]
+
+	# Change the status of a node accounting its energy
+	def setStatus(self, node, status):
+		t = self.simulator.t
+		if node.nodeId not in self.since:
+			self.addNode(node)
+		state = PowerManager.getState(node.status)
+		self.energy[state] += PowerManager.POWER[state]*(t - self.since[node.nodeId])
+		self.since[node.nodeId] = t
+		self.versions[node.nodeId] += 1
+		# Slots on their way
+		if node.nodeId in self.waking:
+			self.waking.discard(node.nodeId)
+			self.wakingMaps -= node.numMaps
+			self.wakingReds -= node.numReds
+		if status.startswith('WAKING-'):
+			self.waking.add(node.nodeId)
+			self.wakingMaps += node.numMaps
+			self.wakingReds += node.numReds
+		node.setStatus(status)
+		self.simulator.history.logNodeStatus(t, node)
+
+	def schedule(self, node, t):
+		self.versions[node.nodeId] += 1
+		self.seq += 1
+		heapq.heappush(self.deadlines, (t, self.seq, node.nodeId, self.versions[node.nodeId]))
+
+	# Time of the next valid deadline
+	def getNextDeadline(self):
+		while len(self.deadlines) > 0 and self.deadlines[0][3] != self.versions[self.deadlines[0][2]]:
+			heapq.heappop(self.deadlines)
+		if len(self.deadlines) > 0:
+			return self.deadlines[0][0]
+		return None
+
+	# Check if a node can go to sleep
+	def canSleep(self, node):
+		return node.status == 'ON' and not node.isRunning() and not self.simulator.isNodeRequired(node.nodeId)
+
+	'''
+	Process the deadlines up to now: transitions that finish and idle timers. Before the assignment.
+	'''
+	def update(self):
+		t = self.simulator.t
+		while self.getNextDeadline() != None and self.deadlines[0][0] <= t:
+			deadline, seq, nodeId, version = heapq.heappop(self.deadlines)
+			node = self.simulator.nodes[nodeId]
+			if node.status.startswith('SLEEPING-'):
+				self.setStatus(node, 'SLEEP')
+				heapq.heappush(self.sleeping, nodeId)
+			elif node.status.startswith('WAKING-'):
+				self.setStatus(node, 'ON')
+				self.candidates.add(nodeId)
+			elif self.canSleep(node) and self.simulator.mapQueued() == 0 and self.simulator.redQueued() == 0:
+				# Idle long enough
+				self.setStatus(node, 'SLEEPING-%d' % self.sleepTime)
+				self.schedule(node, t + self.sleepTime)
+
+	'''
+	Start the idle timers of the nodes that became idle and wake nodes for the queued work. After the assignment.
+	'''
+	def balance(self):
+		t = self.simulator.t
+		for nodeId in sorted(self.candidates):
+			node = self.simulator.nodes[nodeId]
+			if self.canSleep(node):
+				self.schedule(node, t + self.idleTime)
+		self.candidates.clear()
+		# Queued work that the nodes on cannot take
+		while len(self.sleeping) > 0 and (self.simulator.mapsPending > self.wakingMaps or self.simulator.redsPending > self.wakingReds):
+			node = self.simulator.nodes[heapq.heappop(self.sleeping)]
+			if node.status == 'SLEEP':
+				self.setStatus(node, 'WAKING-%d' % self.wakeTime)
+				self.schedule(node, t + self.wakeTime)
+
+	# Energy in J until now
+	def getEnergy(self):
+		t = self.simulator.t
+		ret = sum(self.energy.values())
+		for nodeId in self.since:
+			ret += PowerManager.POWER[PowerManager.getState(self.simulator.nodes[nodeId].status)]*(t - self.since[nodeId])
+		return ret
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+from timeit import default_timer
+
+'''
+Wall time and calls of the phases of the simulation loop.
+Phases can be nested: the time of a phase does not include the phases it calls.
+'''
+
+"""
+Profiler of the simulation phases. The simulator only calls it when it is enabled.
+"""
+class PhaseProfiler:
+	PROGRESS = 'progress'
+	COMPLETE = 'complete'
+	LOG =      'log'
+	MAPS =     'maps'
+	REDS =     'reds'
+	PHASES = (PROGRESS, COMPLETE, LOG, MAPS, REDS)
+
+	def __init__(self):
+		self.times = dict((phase, 0.0) for phase in PhaseProfiler.PHASES)
+		self.calls = dict((phase, 0) for phase in PhaseProfiler.PHASES)
+		# Phases running (the last one is being measured)
+		self.stack = []
+		self.mark = None
+		# Whole run
+		self.wallStart = None
+		self.wall = 0.0
+		self.simStart = None
+		self.sim = 0
+
+	def start(self, phase):
+		now = default_timer()
+		if len(self.stack) > 0:
+			self.times[self.stack[-1]] += now - self.mark
+		self.stack.append(phase)
+		self.calls[phase] += 1
+		self.mark = now
+
+	def stop(self):
+		now = default_timer()
+		self.times[self.stack.pop()] += now - self.mark
+		self.mark = now
+
+	def begin(self, t):
+		self.simStart = t
+		self.wallStart = default_timer()
+
+	def end(self, t):
+		self.wall += default_timer() - self.wallStart
+		self.sim += t - self.simStart
+
+	# Simulated seconds per wall second
+	def getSpeed(self):
+		if self.wall > 0:
+			return self.sim/self.wall
+		return None
+
+	def getReport(self):
+		ret =  'Phase       Time      %      Calls\n'
+		other = self.wall
+		for phase in PhaseProfiler.PHASES:
+			other -= self.times[phase]
+			ret += '%-9s %7.2fs %5.1f%% %10d\n' % (phase, self.times[phase], 100.0*self.times[phase]/self.wall if self.wall > 0 else 0.0, self.calls[phase])
+		ret += '%-9s %7.2fs %5.1f%%\n' % ('other', other, 100.0*other/self.wall if self.wall > 0 else 0.0)
+		ret += 'Total     %7.2fs for %ds simulated' % (self.wall, self.sim)
+		if self.getSpeed() != None:
+			ret += ' (%.0f sim-s/wall-s)' % self.getSpeed()
+		return ret
+
+"""
+History that measures the time spent logging. It wraps the history of the simulator.
+"""
+class ProfiledHistory:
+	def __init__(self, history, profiler):
+		self.history = history
+		self.profiler = profiler
+
+	def __getattr__(self, name):
+		return getattr(self.history, name)
+
+	def logJob(self, job):
+		self.profiler.start(PhaseProfiler.LOG)
+		self.history.logJob(job)
+		self.profiler.stop()
+
+	def logAttempt(self, attempt):
+		self.profiler.start(PhaseProfiler.LOG)
+		self.history.logAttempt(attempt)
+		self.profiler.stop()
+
+	def logNodeStatus(self, t, node):
+		self.profiler.start(PhaseProfiler.LOG)
+		self.history.logNodeStatus(t, node)
+		self.profiler.stop()
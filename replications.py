@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import json
+import math
+import multiprocessing
+import sys
+import time
+
+from workloadmanager import WorkloadManager
+from runsimulator import getParser
+from sweep import setWorkload
+from sweep import runPoint
+
+'''
+Monte Carlo replications of a simulation.
+Every replication uses its own seed and runs in a separate process. It stops
+when the confidence intervals of the turnaround time and the makespan are
+narrower than a target width.
+'''
+
+METRICS = ['turnaround', 'makespan']
+
+def getMean(values):
+	return sum(values)/float(len(values))
+
+def getStdev(values):
+	mean = getMean(values)
+	return math.sqrt(sum((value-mean)**2 for value in values)/(len(values)-1))
+
+# Regularized incomplete beta function I_x(a, b) (continued fraction)
+def getBetaInc(a, b, x):
+	if x <= 0.0:
+		return 0.0
+	if x >= 1.0:
+		return 1.0
+	front = math.exp(math.lgamma(a+b) - math.lgamma(a) - math.lgamma(b) + a*math.log(x) + b*math.log(1.0-x))
+	if x > (a+1.0)/(a+b+2.0):
+		return 1.0 - getBetaInc(b, a, 1.0-x)
+	# Lentz's algorithm
+	tiny = 1e-300
+	c = 1.0
+	d = 1.0 - (a+b)*x/(a+1.0)
+	d = 1.0/(d if abs(d) > tiny else tiny)
+	ret = d
+	for m in range(1, 300):
+		for num in (m*(b-m)*x/((a+2*m-1)*(a+2*m)), -(a+m)*(a+b+m)*x/((a+2*m)*(a+2*m+1))):
+			d = 1.0 + num*d
+			d = 1.0/(d if abs(d) > tiny else tiny)
+			c = 1.0 + num/c
+			c = c if abs(c) > tiny else tiny
+			ret *= c*d
+		if abs(c*d - 1.0) < 1e-12:
+			break
+	return front*ret/a
+
+# Cumulative distribution of the Student t with df degrees of freedom
+def getStudentCDF(t, df):
+	p = 0.5*getBetaInc(df/2.0, 0.5, df/(df+t*t))
+	return 1.0-p if t > 0 else p
+
+# Quantile of the Student t (bisection)
+def getStudentQuantile(p, df):
+	lo, hi = 0.0, 1000.0
+	for i in range(0, 200):
+		mid = (lo+hi)/2.0
+		if getStudentCDF(mid, df) < p:
+			lo = mid
+		else:
+			hi = mid
+	return (lo+hi)/2.0
+
+'''
+Confidence interval of the mean: (mean, half width).
+'''
+def getConfidenceInterval(values, confidence=0.95):
+	mean = getMean(values)
+	if len(values) < 2:
+		return (mean, float('inf'))
+	t = getStudentQuantile(1.0-(1.0-confidence)/2.0, len(values)-1)
+	return (mean, t*getStdev(values)/math.sqrt(len(values)))
+
+# Check if all the intervals are narrower than width (relative to the mean)
+def isNarrow(intervals, width):
+	for mean, half in intervals.values():
+		if mean == 0 or 2.0*half/abs(mean) > width:
+			return False
+	return True
+
+if __name__ == "__main__":
+	parser = getParser()
+	parser.usage = "usage: %prog [runsimulator options] [-K replications] [--width W]"
+	parser.add_option('-K', "--replications",           dest="replications", type="int", default=30,   help="maximum number of replications")
+	parser.add_option('-W', "--width",                  dest="width",     type="float",  default=0.05,  help="stop when the intervals are narrower than this fraction of the mean")
+	parser.add_option('-C', "--confidence",             dest="confidence", type="float", default=0.95,  help="confidence level of the intervals")
+	parser.add_option('-P', "--processes",              dest="processes", type="int",    default=None,  help="number of processes (default: all cores)")
+	parser.add_option('-o', "--out",                    dest="out",       type="string", default=None,  help="JSON file with the results of every replication")
+	(options, args) = parser.parse_args()
+
+	# Parse the workload once
+	rows = None
+	if len(options.infile) > 0:
+		rows = [(job.nmaps, job.lmap, job.nreds, job.lred, job.submit, job.priority) for job in WorkloadManager(options.infile, compiled=True).getJobs()]
+
+	processes = options.processes if options.processes != None else multiprocessing.cpu_count()
+	firstSeed = options.seed if options.seed != None else 0
+	start = time.time()
+	pool = multiprocessing.Pool(processes, initializer=setWorkload, initargs=(rows,))
+	results = []
+	intervals = {}
+	# Run a batch of replications per process until the intervals are narrow
+	while len(results) < options.replications:
+		nbatch = min(processes, options.replications-len(results))
+		seeds = range(firstSeed+len(results), firstSeed+len(results)+nbatch)
+		results += pool.map(runPoint, [(options, {'seed': seed}) for seed in seeds])
+		for metric in METRICS:
+			intervals[metric] = getConfidenceInterval([result[metric] for result in results], options.confidence)
+		print >>sys.stderr, '%d replications: %s' % (len(results), ' '.join('%s=%.1f+/-%.1f' % (metric, intervals[metric][0], intervals[metric][1]) for metric in METRICS))
+		if len(results) >= 3 and isNarrow(intervals, options.width):
+			break
+	pool.close()
+	pool.join()
+
+	if options.out != None:
+		with open(options.out, 'w') as f:
+			json.dump({'replications': results, 'intervals': intervals, 'confidence': options.confidence}, f, indent=1, sort_keys=True)
+
+	# Summary
+	print 'Replications: %d (%.1fs)' % (len(results), time.time() - start)
+	for metric in METRICS:
+		mean, half = intervals[metric]
+		print '%-11s %.1fs +/- %.1fs (%.0f%% CI [%.1f, %.1f])' % (metric.capitalize()+':', mean, half, 100*options.confidence, mean-half, mean+half)
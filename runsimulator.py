@@ -2,13 +2,22 @@
 
 from optparse import OptionParser
 
+import itertools
 import random
 import sys
 
+from commons import isRealistic
 from simulator import Simulator
 from node import Node
 from job import Job
 from workloadmanager import WorkloadManager
+from history import BinaryHistory
+from metrics import MetricsRecorder
+from profiler import PhaseProfiler
+from cluster import readCluster
+from cluster import getNodes
+from locality import Locality
+from scheduler import readQueues
 
 def getPriority(nReds):
 	if nReds<3:
@@ -22,8 +31,8 @@ def getPriority(nReds):
 	else:
 		return Job.Priority.VERY_LOW
 
-def getProbabilisticSJF(nReds, prob):
-	if random.random() < prob:
+def getProbabilisticSJF(nReds, prob, rng=random):
+	if rng.random() < prob:
 		return getPriority(nReds)
 	else:
 		return Job.Priority.NORMAL
@@ -41,11 +50,26 @@ def parseSchedule(sched):
 		res[perc] = float(v)
 	return res
 
-def getProbBySchedule(d, nReds):
-	t = random.random()
+def getProbBySchedule(d, nReds, rng=random):
+	t = rng.random()
 	for i in sorted(d):
 		if t <= i:
-			return getProbabilisticSJF(nReds, d[i])
+			return getProbabilisticSJF(nReds, d[i], rng)
+
+# Assign the priority to the jobs of a workload
+def prioritize(jobs, weights, sjf, rng=random):
+	for job in jobs:
+		if len(weights)>0:
+			job.priority=getProbBySchedule(weights, job.nreds, rng)
+		else:
+			job.priority=getProbabilisticSJF(job.nreds, sjf, rng)
+		yield job
+
+# Random generator of the priorities of a workload. It is not the one of the task lengths, so streaming and loading the workload draw the same priorities.
+def getPriorityRandom(seed):
+	if seed == None and not isRealistic():
+		seed = 0
+	return random.Random(seed)
 
 def unit_test():
 	for i in range(0, 20):
@@ -58,10 +82,10 @@ def unit_test():
 		myjob = simulator.jobs[jobID]
 		print myjob.jobId, myjob.priority, myjob.submit
 
-if __name__ == "__main__":
-	# Parse options
+def getParser():
 	parser = OptionParser()
-	parser.add_option('-l', "--log",                        dest="log",                      default=None,  help="specify the log file")
+	parser.add_option('-l', "--log",                        dest="log",                      default=None,  help="specify the log file (binary if it ends with .bin)")
+	parser.add_option('-b', "--background",action="store_true", dest="background", default=False, help="write the binary log in a background thread")
 
 	parser.add_option('-n', "--nodes",                      dest="nodes",     type="int",    default=9,    help="specify the number of nodes")
 	parser.add_option('-x', "--mapslot",                      dest="mapslot",     type="int",    default=4,    help="specify the number of map slots")
@@ -70,42 +94,94 @@ if __name__ == "__main__":
 	parser.add_option('-g', "--gauss",                      dest="gauss",     type="float",  default=None,  help="specify the variance of the task length")
 
 	parser.add_option('-r', "--real",action="store_true", dest="realistic", default=False, help="run a realistic simulation")
+	parser.add_option('-d', "--seed",                       dest="seed",      type="int",    default=None,  help="specify the random seed (default: 0)")
 	parser.add_option('-m',"--manage",action="store_true",dest="manage",default=False,help="manage node disabled by default")
+	parser.add_option('-e', "--events",action="store_true", dest="events",    default=False, help="jump between events instead of iterating every second")
+	parser.add_option('-c', "--compact",action="store_true", dest="compact",   default=False, help="store the tasks in typed arrays")
+	parser.add_option('-R', "--release",action="store_true", dest="release",   default=False, help="free the tasks of the finished jobs")
+	parser.add_option('-V', "--vectorized",action="store_true", dest="vectorized", default=False, help="progress all the running attempts at once (faster with NumPy)")
+	parser.add_option('-L', "--locality",action="store_true", dest="locality", default=False, help="place the input blocks in the nodes and prefer the maps with local data")
+	parser.add_option("--replication",                      dest="replication", type="int", default=3,    help="replicas of each input block")
+	parser.add_option("--racksize",                         dest="racksize",  type="int",    default=20,    help="nodes per rack")
+	parser.add_option("--delay",                            dest="delay",     type="float",  default=5,     help="seconds a job waits for a node-local map and then for a rack-local map")
+	parser.add_option("--factors",                          dest="factors",   type="string", default="1.0,1.2,1.5", help="map length multipliers: node-local,rack-local,remote")
+	parser.add_option('-H', "--cluster",                    dest="cluster",   type="string", default=None,  help="cluster specification file: name nodes mapslots redslots [speed] [bandwidth] per line (instead of -n/-x/-y)")
+	parser.add_option("--slowstart",                        dest="slowstart", type="float",  default=1.0,   help="fraction of the maps of a job that finish before its reduces start")
+	parser.add_option("--mapoutput",                        dest="mapoutput", type="float",  default=0.0,   help="MB of output of each map that the reduces copy (shuffle)")
+	parser.add_option("--bandwidth",                        dest="bandwidth", type="float",  default=128.0, help="MB/s of network of each node, shared by its reduce slots")
+	parser.add_option('-M', "--metrics",                    dest="metrics",   type="string", default=None,  help="record the cluster metrics into this file (CSV or .npy)")
+	parser.add_option('-i', "--interval",                   dest="interval",  type="int",    default=60,    help="seconds between metric samples")
+	parser.add_option('-t', "--profile",action="store_true", dest="profile",   default=False, help="measure the time of each phase of the simulation")
+	parser.add_option('-k', "--checkpoint",                 dest="checkpoint", type="string", default=None, help="save checkpoints into this file (%d is replaced by the time, .gz compresses)")
+	parser.add_option('-a', "--checkpointat",               dest="checkpointat", type="string", default="", help="simulated times of the checkpoints: t1,t2,...")
+	parser.add_option('-E', "--checkpointevery",            dest="checkpointevery", type="float", default=None, help="save a checkpoint every this many wall seconds")
+	parser.add_option('-u', "--restore",                    dest="restore",   type="string", default=None,  help="continue the simulation saved in this checkpoint")
 
 	parser.add_option('-s', "--sjf",                        dest="sjf",       type="float",  default=0.0,   help="specify the percentage of newly submitted job using SJF scheduling")
 	parser.add_option('-w', "--weight",                     dest="weight",       type="string",  default="",   help="specify the detailed cheduling weight [X%:Y]")
 	parser.add_option('-f', "--infile",                     dest="infile",    type="string", default="",    help="workload file")
-      parser.add_option('-sp', "--schedulingPolicy",                     dest="schedulingPolicy",    type="int", default=2,    help="SJF=0, FIFO=1, FIFOPR = 2")
-
-
-	(options, args) = parser.parse_args()
-	#options.realistic
-	options.og = None
+	parser.add_option('-S', "--stream",action="store_true", dest="stream",    default=False, help="read the workload file during the simulation (sorted by submission)")
+	parser.add_option('-p', "--schedulingPolicy",                     dest="schedulingPolicy",    type="string", default="fifopr", help="scheduler: sjf, fifo, fifopr, fair or capacity (or SJF=0, FIFO=1, FIFOPR = 2)")
+	parser.add_option('-Q', "--queues",                     dest="queues",    type="string", default=None,  help="pools/queues of the fair and capacity schedulers: name capacity [priorities] per line")
+	return parser
+
+'''
+Create a simulator with its nodes and jobs from the options.
+The jobs of the workload can be given instead of reading options.infile.
+'''
+def createSimulator(options, jobs=None):
 	# Initialize simulator
-	simulator = Simulator(logfile=options.log)
-      simulator.schedulingPolicy = options.schedulingPolicy
+	simulator = Simulator(logfile=options.log, seed=options.seed)
+	simulator.setScheduler(options.schedulingPolicy, getQueues(options))
+	simulator.eventDriven = options.events
+	simulator.compactTasks = options.compact
+	simulator.releaseTasks = options.release
+	simulator.vectorized = options.vectorized
+	simulator.slowstart = options.slowstart
+	simulator.mapOutput = options.mapoutput
+	if isinstance(simulator.history, BinaryHistory):
+		simulator.history.background = options.background
+	if options.metrics != None:
+		simulator.metrics = MetricsRecorder(options.interval)
+	if options.profile:
+		simulator.profiler = PhaseProfiler()
+	setCheckpoints(simulator, options)
+	if options.locality:
+		simulator.locality = Locality(simulator, options.replication, options.racksize, options.seed)
+		simulator.locality.factors = dict(enumerate(float(factor) for factor in options.factors.split(',')))
+		simulator.locality.nodeDelay = options.delay
+		simulator.locality.rackDelay = options.delay
 	# Add servers
-	for i in range(0, options.nodes):
-		simulator.nodes['aws%03d' % i] = Node('aws%03d' % i) 
-		simulator.nodes['aws%03d' % i].numMaps = options.mapslot
-		simulator.nodes['aws%03d' % i].redMaps = options.redslot
+	if options.cluster != None:
+		for node in getNodes(readCluster(options.cluster, options.bandwidth)):
+			simulator.nodes[node.nodeId] = node
+	else:
+		for i in range(0, options.nodes):
+			simulator.nodes['aws%03d' % i] = Node('aws%03d' % i) 
+			simulator.nodes['aws%03d' % i].numMaps = options.mapslot
+			simulator.nodes['aws%03d' % i].numReds = options.redslot
+			simulator.nodes['aws%03d' % i].bandwidth = options.bandwidth
 
 	# Test
 	#print 'run unit test'
 	#unit_test()
 
 	# Add jobs
-	if len(options.infile) > 0: #wl
+	if jobs != None or len(options.infile) > 0: #wl
 		simulator.nodeManagement = options.manage #disabled do not need to consider reboot
-		manager = WorkloadManager(options.infile) #line by line 
 		weights = {}
 		weights = parseSchedule(options.weight) #advanced e.g. 25% short job first 75% FIFO
-		for job in manager.getJobs():#based on arrival time
-			if len(weights)>0:
-				job.priority=getProbBySchedule(weights, job.nreds)
-			else:
-				job.priority=getProbabilisticSJF(job.nreds, options.sjf)
-			simulator.addJob(job) #queue
+		if options.stream:
+			# Read the jobs as the simulation reaches their submission time
+			if jobs == None:
+				jobs = WorkloadManager.stream(options.infile, compiled=True)
+			simulator.addJobSource(prioritize(jobs, weights, options.sjf, getPriorityRandom(options.seed)))
+		else:
+			if jobs == None:
+				manager = WorkloadManager(options.infile, compiled=True) #binary version of the file
+				jobs = manager.getJobs()
+			for job in prioritize(jobs, weights, options.sjf, getPriorityRandom(options.seed)):#based on arrival time
+				simulator.addJob(job) #queue
 	else:
 		# Submit jobs
 		for i in range(0, options.jobs):
@@ -113,13 +189,59 @@ if __name__ == "__main__":
 			job = Job(nmaps=64, lmap=140, nreds=1, lred=15, submit=0)
 			job.gauss = options.gauss # +/-%
 			# Probabilistic shortest job first policy
-			job.priority = getProbabilisticSJF(job.nreds, options.sjf)
+			job.priority = getProbabilisticSJF(job.nreds, options.sjf, simulator.random)
 			jobId = simulator.addJob(job)
+	return simulator
+
+# Pools/queues of the schedulers
+def getQueues(options):
+	if options.queues != None:
+		return readQueues(options.queues)
+	return None
+
+def setCheckpoints(simulator, options):
+	if options.checkpoint != None:
+		simulator.checkpointFile = options.checkpoint
+		simulator.checkpointTimes = [int(t) for t in options.checkpointat.split(',') if len(t) > 0]
+		simulator.checkpointInterval = options.checkpointevery
+
+'''
+Load a simulator from a checkpoint. The workload file is only read again when streaming.
+'''
+def restoreSimulator(options):
+	simulator = Simulator.restore(options.restore)
+	if options.profile and simulator.profiler == None:
+		simulator.profiler = PhaseProfiler()
+	if options.stream and len(options.infile) > 0:
+		# Draw the priorities of the jobs already read again
+		jobs = prioritize(WorkloadManager.stream(options.infile, compiled=True), parseSchedule(options.weight), options.sjf, getPriorityRandom(options.seed))
+		simulator.resumeJobSource(itertools.islice(jobs, simulator.jobsRead, None))
+	setCheckpoints(simulator, options)
+	return simulator
 
-	# Start running simulator
-	simulator.run()
+if __name__ == "__main__":
+	# Parse options
+	parser = getParser()
+	(options, args) = parser.parse_args()
+	#options.realistic
+	options.og = None
+	if options.restore != None:
+		simulator = restoreSimulator(options)
+		simulator.resume()
+	else:
+		simulator = createSimulator(options)
+
+		# Start running simulator
+		simulator.run()
+	if simulator.metrics != None and options.metrics != None:
+		simulator.metrics.save(options.metrics)
 
 	# Summary
 	print 'Nodes:   %d'  %      len(simulator.nodes)
 	print 'Perf:    %.1fs %d jobs' % (simulator.getPerformance(), len(simulator.jobs))
-
+	if simulator.nodeManagement:
+		print 'Energy:  %.1fWh' % simulator.getEnergy()
+	if simulator.locality != None:
+		print 'Maps:    %s' % simulator.locality.getReport()
+	if simulator.profiler != None:
+		print simulator.profiler.getReport()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+
+from job import Task
+from jobqueue import JobQueue
+
+'''
+Schedulers: they choose the job that gets the next free map or reduce slot.
+The simulator reports the jobs and the attempts through the hooks of Scheduler.
+The schedulers keep the jobs with queued tasks in heaps (JobQueue), so choosing
+a job does not walk the jobs that have nothing to run. They are selected by name
+(SCHEDULERS, runsimulator -p).
+'''
+
+TASK_TYPES = (Task.Type.MAP, Task.Type.RED)
+
+# Queued tasks of a type in a job
+def getQueued(job, taskType):
+	if taskType == Task.Type.MAP:
+		return job.mapQueued()
+	return job.redQueued()
+
+"""
+Interface of the schedulers.
+"""
+class Scheduler(object):
+	def __init__(self, simulator, queues=None):
+		self.simulator = simulator
+
+	# Set the sort keys again (they are not stored in the checkpoints)
+	def setKeys(self):
+		pass
+
+	# The scheduling policy of the simulator changed
+	def rekey(self):
+		pass
+
+	# A job reached its submission time
+	def addJob(self, job):
+		pass
+
+	# The queued tasks of a job changed (e.g., the maps finished and the reduces can start)
+	def updateJob(self, job):
+		pass
+
+	def removeJob(self, job):
+		pass
+
+	def startAttempt(self, attempt):
+		pass
+
+	def completeAttempt(self, attempt):
+		pass
+
+	# The nodes or their slots changed
+	def updateNodes(self):
+		pass
+
+	'''
+	Ids of the jobs with queued tasks of a type in the order they get the next slot.
+	The scheduler cannot change during the walk.
+	'''
+	def getJobs(self, taskType):
+		raise NotImplementedError
+
+	# Get a queued task of a type. The simulator reports its start with startAttempt().
+	def getTask(self, taskType):
+		for jobId in self.getJobs(taskType):
+			job = self.simulator.jobs[jobId]
+			attempt = job.getMapTask() if taskType == Task.Type.MAP else job.getRedTask()
+			if attempt != None:
+				return attempt
+		return None
+
+"""
+Jobs in the order of the scheduling policy of the simulator (SJF, FIFO or FIFOPR).
+"""
+class QueueScheduler(Scheduler):
+	def __init__(self, simulator, queues=None):
+		Scheduler.__init__(self, simulator)
+		# Jobs with queued tasks of each type
+		self.queues = dict((taskType, JobQueue(None)) for taskType in TASK_TYPES)
+		# Submission order (ties of the policy)
+		self.seq = 0
+		self.seqs = {}
+		self.setKeys()
+
+	def setKeys(self):
+		for queue in self.queues.values():
+			queue.key = self.simulator.schedulingPolicy
+
+	def rekey(self):
+		for queue in self.queues.values():
+			queue.rekey()
+
+	def addJob(self, job):
+		self.seq += 1
+		self.seqs[job.jobId] = self.seq
+		self.updateJob(job)
+
+	def updateJob(self, job):
+		for taskType, queue in self.queues.items():
+			if getQueued(job, taskType) > 0:
+				if job.jobId not in queue:
+					queue.add(job.jobId, self.seqs[job.jobId])
+			elif job.jobId in queue:
+				queue.remove(job.jobId)
+
+	def startAttempt(self, attempt):
+		self.updateJob(attempt.getJob())
+
+	def removeJob(self, job):
+		for queue in self.queues.values():
+			if job.jobId in queue:
+				queue.remove(job.jobId)
+		self.seqs.pop(job.jobId, None)
+
+	def getJobs(self, taskType):
+		return iter(self.queues[taskType])
+
+"""
+Pool (fair scheduler) or queue (capacity scheduler). The leaves hold the jobs.
+"""
+class Pool(object):
+	def __init__(self, name, capacity=100.0, parent=None, index=0):
+		self.name = name
+		self.parent = parent
+		self.children = []
+		self.index = index # Order in the configuration
+		# Fraction of the cluster (the capacity is a percentage of the parent)
+		self.share = capacity/100.0
+		if parent != None:
+			self.share *= parent.share
+			parent.children.append(self)
+		# Jobs with queued tasks of each type (leaves)
+		self.jobs = dict((taskType, JobQueue(None)) for taskType in TASK_TYPES)
+		# Queued and running tasks of the pool and its children
+		self.queued =  dict((taskType, 0) for taskType in TASK_TYPES)
+		self.running = dict((taskType, 0) for taskType in TASK_TYPES)
+		# Fair scheduler: slots the pool should have and slot-seconds it is owed
+		self.fairShare = dict((taskType, 0.0) for taskType in TASK_TYPES)
+		self.deficit =   dict((taskType, 0.0) for taskType in TASK_TYPES)
+
+	def isLeaf(self):
+		return len(self.children) == 0
+
+	# The pool and its ancestors
+	def getPath(self):
+		pool = self
+		while pool != None:
+			yield pool
+			pool = pool.parent
+
+'''
+Read a pool/queue configuration file. One pool per line:
+# name       capacity(% of the parent) [priorities of its jobs]
+prod         70
+prod.etl     50  5,4
+prod.adhoc   50  3
+dev          30  2,1
+'''
+def readQueues(filename):
+	ret = []
+	with open(filename, 'r') as f:
+		for lineno, line in enumerate(f, 1):
+			line = line.strip()
+			if line.startswith('#') or len(line) == 0:
+				continue
+			splits = line.split()
+			if len(splits) < 2:
+				raise ValueError('%s:%d: expected name capacity [priorities]' % (filename, lineno))
+			priorities = [int(priority) for priority in splits[2].split(',')] if len(splits) > 2 else []
+			ret.append((splits[0], float(splits[1]), priorities))
+	return ret
+
+"""
+Scheduler over a tree of pools. A job goes to the leaf that lists its priority,
+else to the leaf named as its pool, else to the leaf "default" (it gets the
+capacity the other pools leave).
+"""
+class PoolScheduler(Scheduler):
+	def __init__(self, simulator, queues=None):
+		Scheduler.__init__(self, simulator)
+		self.root = Pool('root')
+		self.pools = {}
+		self.priorities = {}
+		for name, capacity, priorities in (queues or []):
+			parent = self.root
+			if '.' in name:
+				if name.rsplit('.', 1)[0] not in self.pools:
+					raise ValueError('the parent of %s must be defined before it' % name)
+				parent = self.pools[name.rsplit('.', 1)[0]]
+			self.pools[name] = Pool(name, capacity, parent, len(self.pools))
+			for priority in priorities:
+				self.priorities[priority] = self.pools[name]
+		# The jobs only run in the leaves
+		for priority, pool in sorted(self.priorities.items()):
+			if not pool.isLeaf():
+				raise ValueError('priority %d is given to %s, which has child pools: give it to one of its children' % (priority, pool.name))
+		if 'default' not in self.pools:
+			capacity = max(0.0, 100.0 - 100.0*sum(pool.share for pool in self.root.children))
+			self.pools['default'] = Pool('default', capacity, self.root, len(self.pools))
+		self.leaves = [pool for pool in self.pools.values() if pool.isLeaf()]
+		self.leaves.sort(key=lambda pool: pool.index)
+		# Leaf, queued and running tasks of each job
+		self.jobPools = {}
+		self.queued =  dict((taskType, {}) for taskType in TASK_TYPES)
+		self.running = dict((taskType, {}) for taskType in TASK_TYPES)
+		# Submission order (ties between jobs)
+		self.seq = 0
+		self.seqs = {}
+		self.setKeys()
+
+	def getLeaf(self, job):
+		if job.priority in self.priorities:
+			return self.priorities[job.priority]
+		if job.pool in self.pools and self.pools[job.pool].isLeaf():
+			return self.pools[job.pool]
+		return self.pools['default']
+
+	# Sort key of the jobs in a leaf (per task type)
+	def getJobKey(self, taskType):
+		return self.simulator.schedulingPolicy
+
+	def setKeys(self):
+		for leaf in self.leaves:
+			for taskType in TASK_TYPES:
+				leaf.jobs[taskType].key = self.getJobKey(taskType)
+
+	def rekey(self):
+		for leaf in self.leaves:
+			for queue in leaf.jobs.values():
+				queue.rekey()
+
+	# Hooks around the changes of the pools
+	def changing(self):
+		pass
+
+	def changed(self):
+		pass
+
+	def addJob(self, job):
+		self.seq += 1
+		self.seqs[job.jobId] = self.seq
+		self.jobPools[job.jobId] = self.getLeaf(job)
+		self.updateJob(job)
+
+	def updateJob(self, job):
+		self.changing()
+		self.syncJob(job)
+		self.changed()
+
+	# Update the queued tasks of a job in its pools
+	def syncJob(self, job):
+		leaf = self.jobPools[job.jobId]
+		for taskType in TASK_TYPES:
+			queued = getQueued(job, taskType) if job.jobId in self.seqs else 0
+			delta = queued - self.queued[taskType].get(job.jobId, 0)
+			if delta != 0:
+				for pool in leaf.getPath():
+					pool.queued[taskType] += delta
+				self.queued[taskType][job.jobId] = queued
+			queue = leaf.jobs[taskType]
+			if queued > 0 and job.jobId not in queue:
+				queue.add(job.jobId, self.seqs[job.jobId])
+			elif queued == 0 and job.jobId in queue:
+				queue.remove(job.jobId)
+
+	def removeJob(self, job):
+		self.changing()
+		self.seqs.pop(job.jobId, None)
+		self.syncJob(job)
+		for taskType in TASK_TYPES:
+			self.queued[taskType].pop(job.jobId, None)
+			self.running[taskType].pop(job.jobId, None)
+		del self.jobPools[job.jobId]
+		self.changed()
+
+	def startAttempt(self, attempt):
+		self.changing()
+		self.addRunning(attempt, 1)
+		self.syncJob(attempt.getJob())
+		self.changed()
+
+	def completeAttempt(self, attempt):
+		self.changing()
+		self.addRunning(attempt, -1)
+		self.changed()
+
+	def addRunning(self, attempt, delta):
+		jobId = attempt.getJobId()
+		taskType = attempt.taskType
+		self.running[taskType][jobId] = self.running[taskType].get(jobId, 0) + delta
+		for pool in self.jobPools[jobId].getPath():
+			pool.running[taskType] += delta
+		queue = self.jobPools[jobId].jobs[taskType]
+		if jobId in queue:
+			queue.update(jobId)
+
+	# Leaves with queued tasks of a type in the order they get the next slot
+	def getPools(self, taskType):
+		raise NotImplementedError
+
+	def getJobs(self, taskType):
+		for leaf in self.getPools(taskType):
+			for jobId in leaf.jobs[taskType]:
+				yield jobId
+
+"""
+Fair scheduler. The pools share the slots by weight (their capacity) and each
+pool accumulates a deficit: the slot-seconds between its fair share and its
+running tasks. The pool with the largest deficit gets the next slot and, in the
+pool, the job with the fewest running tasks.
+"""
+class FairScheduler(PoolScheduler):
+	def __init__(self, simulator, queues=None):
+		self.last = simulator.t
+		self.slots = None
+		PoolScheduler.__init__(self, simulator, queues)
+
+	def getJobKey(self, taskType):
+		running = self.running[taskType]
+		return lambda jobId: running.get(jobId, 0)
+
+	# Slots of each type in the cluster
+	def getSlots(self, taskType):
+		if self.slots == None:
+			nodes = self.simulator.nodes.values()
+			self.slots = {Task.Type.MAP: sum(node.numMaps for node in nodes), Task.Type.RED: sum(node.numReds for node in nodes)}
+		return self.slots[taskType]
+
+	def updateNodes(self):
+		self.changing()
+		self.slots = None
+		self.changed()
+
+	# Deficit of a pool at the current time
+	def getDeficit(self, pool, taskType):
+		return pool.deficit[taskType] + (pool.fairShare[taskType] - pool.running[taskType])*(self.simulator.t - self.last)
+
+	# Accumulate the deficits until now
+	def changing(self):
+		t = self.simulator.t
+		if t > self.last:
+			for pool in self.leaves:
+				for taskType in TASK_TYPES:
+					pool.deficit[taskType] = self.getDeficit(pool, taskType)
+			self.last = t
+
+	'''
+	Fair shares: the slots are split by weight between the pools with tasks, and
+	the slots a pool does not need go to the others (max-min fairness).
+	'''
+	def changed(self):
+		for taskType in TASK_TYPES:
+			pools = []
+			for pool in self.leaves:
+				pool.fairShare[taskType] = 0.0
+				demand = pool.queued[taskType] + pool.running[taskType]
+				if demand > 0 and pool.share > 0:
+					pools.append((demand/pool.share, pool.index, pool, demand))
+			pools.sort()
+			slots = float(self.getSlots(taskType))
+			weight = sum(pool.share for ratio, index, pool, demand in pools)
+			for ratio, index, pool, demand in pools:
+				pool.fairShare[taskType] = min(demand, slots*pool.share/weight)
+				slots -= pool.fairShare[taskType]
+				weight -= pool.share
+
+	def getPools(self, taskType):
+		pools = []
+		for pool in self.leaves:
+			if pool.queued[taskType] > 0:
+				running = pool.running[taskType]/pool.share if pool.share > 0 else float('inf')
+				pools.append((-self.getDeficit(pool, taskType), running, pool.index, pool))
+		pools.sort()
+		return [pool for deficit, running, index, pool in pools]
+
+"""
+Capacity scheduler. The queues form a tree and each one is guaranteed a
+capacity of its parent. From the root, the child queue with tasks that uses the
+smallest fraction of its capacity gets the next slot. The jobs of a queue follow
+the scheduling policy of the simulator.
+"""
+class CapacityScheduler(PoolScheduler):
+	def getPools(self, taskType):
+		return self.getLeaves(self.root, taskType)
+
+	def getLeaves(self, pool, taskType):
+		children = []
+		for child in pool.children:
+			if child.queued[taskType] > 0:
+				used = child.running[taskType]/child.share if child.share > 0 else float('inf')
+				children.append((used, child.index, child))
+		children.sort()
+		for used, index, child in children:
+			if child.isLeaf():
+				yield child
+			else:
+				for leaf in self.getLeaves(child, taskType):
+					yield leaf
+
+# Schedulers by name. The ordering ones use the scheduling policy with the same name.
+SCHEDULERS = {
+	'sjf':      QueueScheduler,
+	'fifo':     QueueScheduler,
+	'fifopr':   QueueScheduler,
+	'fair':     FairScheduler,
+	'capacity': CapacityScheduler,
+}
+
+def registerScheduler(name, scheduler):
+	SCHEDULERS[name] = scheduler
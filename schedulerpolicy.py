@@ -1,40 +1,41 @@
 #!/usr/bin/env python
 
 from job import Job
+from jobqueue import JobQueue
+
 class SchedulerPolicy:
 	class Type:
 		SJF    = 0
 		FIFO   = 1
 		FIFOPR = 2
+		toString = {SJF:'sjf', FIFO:'fifo', FIFOPR:'fifopr'}
 
 	def __init__(self):
 		# Jobs
 		self.jobs = {}
-		self.jobsQueue = []
+		self.jobsQueue = JobQueue(self.schedulingPolicy)
 		self.jobsDone = []
 		self.schedType = SchedulerPolicy.Type.FIFOPR
 	'''
 	Scheduling policies.
-	Returns the order of 2 jobs according to the scheduling policy
+	Returns the sort key of a job according to the scheduling policy (lower runs first)
 	'''
-	def schedulingPolicy(self, jobId1, jobId2):
+	def schedulingPolicy(self, jobId):
 		if self.schedType == SchedulerPolicy.Type.SJF:
-			return self.schedulingSJF(jobId1, jobId2)
+			return self.schedulingSJF(jobId)
+		elif self.schedType == SchedulerPolicy.Type.FIFO:
+			return self.schedulingFIFO(jobId)
 		elif self.schedType == SchedulerPolicy.Type.FIFOPR:
-			return self.schedulingFIFOprior(jobId1, jobId2)
-
+			return self.schedulingFIFOprior(jobId)
 
-	def schedulingFIFO(self, jobId1, jobId2):
-		return self.jobs[jobId1].submit-self.jobs[jobId2].submit
+	def schedulingFIFO(self, jobId):
+		return self.jobs[jobId].submit
 
-	def schedulingFIFOprior(self, jobId1, jobId2):
-		if self.jobs[jobId1].priority==self.jobs[jobId2].priority:
-			return self.jobs[jobId1].submit-self.jobs[jobId2].submit
-		else:
-			return self.jobs[jobId2].priority-self.jobs[jobId1].priority
+	def schedulingFIFOprior(self, jobId):
+		# Higher priority first, then submission order
+		return (-self.jobs[jobId].priority, self.jobs[jobId].submit)
 
-	def schedulingSJF(self, jobId1, jobId2):
+	def schedulingSJF(self, jobId):
 		# One approach can be to check length of the jobs in the queue
 		# Sort it according to the length
-		return self.jobs[jobId2].nmaps*self.jobs[jobId2].lmap - self.jobs[jobId1].nmaps*self.jobs[jobId1].lmap
-
+		return -self.jobs[jobId].nmaps*self.jobs[jobId].lmap
@@ -2,36 +2,76 @@
 
 from commons import isRealistic
 
+import cPickle
+import gzip
+import heapq
 import math
+import os
 import random
+import time
 if not isRealistic():
 	random.seed(0)
 
 from operator import attrgetter
 
 from node import Node
+from slotpool import SlotPool
 from job import Job
+from job import Task
 from schedulerpolicy import SchedulerPolicy
+from scheduler import QueueScheduler
+from scheduler import SCHEDULERS
+from jobqueue import JobQueue
 from history import History
+from history import BinaryHistory
 from history import HistoryViewer
+from profiler import PhaseProfiler
+from profiler import ProfiledHistory
+from power import PowerManager
+from attempttable import AttemptTable
+from taskstore import nodeTable
 import sys
 from datetime import datetime
 
 
 
 class Simulator(SchedulerPolicy):
-	def __init__(self, logfile='history.log'):
+	def __init__(self, logfile='history.log', seed=None):
 		# Initialize the scheduler
 		SchedulerPolicy.__init__(self) # super()
            #default: self.schedType = SchedulerPolicy.Type.FIFOPR
 		self.t = 0
+		# Random generator of this simulation
+		if seed == None and not isRealistic():
+			seed = 0
+		self.random = random.Random(seed)
 		# Nodes
 		self.nodes = {}
+		self.pool = SlotPool()
+		# Active jobs that ran attempts in each node and the other way around
+		self.nodeJobs = {}
+		self.jobNodes = {}
 		# History
 		self.logfile = logfile
-		self.history = History(filename=self.logfile)
+		if self.logfile != None and self.logfile.endswith('.bin'):
+			self.history = BinaryHistory(filename=self.logfile)
+		else:
+			self.history = History(filename=self.logfile)
 		# Job submission
 		self.lastJobId = 1
+		# Jobs waiting for their submission time: (submit, jobId)
+		self.jobsSubmit = []
+		# Jobs not added yet, read as the time reaches their submission
+		self.jobSource = None
+		self.nextJob = None
+		self.jobsRead = 0 # Jobs read from the source
+		# Jobs that reached their submission time, in scheduling order
+		self.jobsSubmitted = JobQueue(self.schedulingPolicy)
+		# Chooses the jobs of the free slots (see scheduler)
+		self.scheduler = QueueScheduler(self)
+		# Queued tasks of the submitted jobs
+		self.mapsPending = 0
+		self.redsPending = 0
 		# Simulation
 		self.maxTime = None
 		# Id for jobs
@@ -40,66 +80,103 @@ class Simulator(SchedulerPolicy):
 		else:
 			self.trackerId = datetime.now().strftime('%4Y%2m%2d%2H%2M')
 		# Specify if the nodes are sent to sleep when there's no load
-		self.nodeManagement = True
+		self.nodeManagement = False
+		self.power = None
 
 		# Outputs
 		self.energy = None
 
 		# Step length
 		self.STEP = 1
+		# Jump between events instead of iterating every STEP
+		self.eventDriven = False
+		# Store the tasks of the jobs in typed arrays
+		self.compactTasks = False
+		# Free the tasks of the jobs when they finish
+		self.releaseTasks = False
+		# Progress all the running attempts at once (AttemptTable) instead of node by node
+		self.vectorized = False
+		self.attemptTable = None
+		# Time series of the cluster metrics (MetricsRecorder)
+		self.metrics = None
+		# Time per phase of the simulation loop (PhaseProfiler)
+		self.profiler = None
+		# Block placement and locality-aware map scheduling (Locality)
+		self.locality = None
+		# Slow start and MB of output per map of the jobs (None: the values of each job)
+		self.slowstart = None
+		self.mapOutput = None
+
+		# Checkpoints: file (%d is replaced by the time), simulated times and interval in wall seconds
+		self.checkpointFile = None
+		self.checkpointTimes = []
+		self.checkpointInterval = None
+		self.checkpointWall = None
+
+		# State of the event engine (completions, order of the nodes, assignments, submissions)
+		self.completions = None
+		self.nodeOrder = None
+		self.nassigned = 0
+		self.submissions = None
+		# Reduces copying map outputs: step engine (AttemptTable) and event engine (job id -> attempts)
+		self.shuffling = []
+		self.shuffles = {}
 
 	# Submit a job to run
 	def addJob(self, job):
+		self.initJob(job)
+		# Queue according to submission order/FIFOPR
+		self.jobsQueue.add(job.jobId)
+		heapq.heappush(self.jobsSubmit, (job.submit, job.jobId))
+		return job.jobId
+
+	# Prepare a new job and save it
+	def initJob(self, job):
 		# Assign automatic job id
 		if job.jobId == None:
-			while 'job_%s_%04d' % (self.trackerId, self.lastJobId) in self.jobs:
+			jobId = 'job_%s_%04d' % (self.trackerId, self.lastJobId)
+			while jobId in self.jobs:
 				self.lastJobId += 1
-			job.jobId = 'job_%s_%04d' % (self.trackerId, self.lastJobId)
-		# Initialize tasks
-		job.initTasks()
+				jobId = 'job_%s_%04d' % (self.trackerId, self.lastJobId)
+			job.jobId = jobId
+			self.lastJobId += 1
+		job.random = self.random
+		if self.slowstart != None:
+			job.slowstart = self.slowstart
+		if self.mapOutput != None:
+			job.mapOutput = self.mapOutput
+		# The tasks are initialized when the job is submitted
+		if self.compactTasks:
+			job.compact = True
 
 		# Save the information
 		self.jobs[job.jobId] = job
-		self.jobsQueue.append(job.jobId)
 
-		# Sort the queue according to submission order/FIFOPR
-		self.jobsQueue = sorted(self.jobsQueue, cmp=self.schedulingPolicy)
-
-		return job.jobId
+	# Register the nodes added to self.nodes in the free slot pool
+	def getPool(self):
+		if len(self.pool) != len(self.nodes):
+			for nodeId in self.nodes:
+				if nodeId not in self.pool.nodes:
+					self.pool.addNode(self.nodes[nodeId])
+		return self.pool
 
-	# Check if there is any idle node for reduces
+	# Check if there is any idle node for maps
 	def getIdleNodeMap(self):
-		for nodeId in sorted(self.nodes):
-			node = self.nodes[nodeId]
-			if node.status == 'ON' and len(node.maps) < node.numMaps:
-				return node
-		return None
+		return self.getPool().getIdleNodeMap()
 
 	def getIdleNodesMap(self):
-		ret = []
-		for nodeId in sorted(self.nodes):
-			node = self.nodes[nodeId]
-			if node.status == 'ON' and len(node.maps) < node.numMaps:
-				ret.append(node)
-		return ret
+		return self.getPool().getIdleNodesMap()
 
 	# Check if there is any idle node for reduces
 	def getIdleNodeRed(self):
-		for nodeId in sorted(self.nodes):
-			node = self.nodes[nodeId]
-			if node.status == 'ON' and len(node.reds) < node.numReds:
-				return node
-		return None
+		return self.getPool().getIdleNodeRed()
 
 	def getIdleNodesRed(self):
-		ret = []
-		for nodeId in sorted(self.nodes):
-			node = self.nodes[nodeId]
-			if node.status == 'ON' and len(node.reds) < node.numReds:
-				ret.append(node)
-		return ret
+		return self.getPool().getIdleNodesRed()
 
 	def getWakingNodes(self):
+		if self.power != None:
+			return len(self.power.waking)
 		ret = 0
 		for nodeId in self.nodes:
 			node = self.nodes[nodeId]
@@ -107,34 +184,77 @@ class Simulator(SchedulerPolicy):
 				ret += 1
 		return ret
 
-	# Get a queued map
-	def getMapTask(self):
-		for jobId in self.jobsQueue:
+	'''
+	Add the jobs from an iterator (sorted by submission time) when the time reaches their submission.
+	'''
+	def addJobSource(self, jobs):
+		self.jobSource = iter(jobs)
+		self.readJob()
+
+	# Continue reading the jobs of a restored simulator (the source must skip the jobsRead jobs already read)
+	def resumeJobSource(self, jobs):
+		self.jobSource = iter(jobs)
+
+	def readJob(self):
+		self.nextJob = next(self.jobSource, None) if self.jobSource != None else None
+		if self.nextJob != None:
+			self.jobsRead += 1
+
+	# Add the jobs from the source that reached their submission time
+	def pullJobs(self):
+		while self.nextJob != None and self.nextJob.submit <= self.t:
+			self.addJob(self.nextJob)
+			self.readJob()
+
+	# Check if there are jobs to run
+	def hasJobs(self):
+		return len(self.jobsQueue) > 0 or self.nextJob != None
+
+	# Account for the queued tasks of the jobs that reached their submission time
+	def updateSubmitted(self):
+		self.pullJobs()
+		while len(self.jobsSubmit) > 0 and self.jobsSubmit[0][0] <= self.t:
+			submit, jobId = heapq.heappop(self.jobsSubmit)
 			job = self.jobs[jobId]
-			if self.t >= job.submit:
-				mapTask = job.getMapTask()
-				if mapTask != None:
-					return mapTask
-		return None
+			# Initialize tasks
+			if not job.hasTasks:
+				job.initTasks()
+				if self.locality != None:
+					self.locality.addJob(job)
+			self.jobsSubmitted.add(jobId)
+			self.scheduler.addJob(job)
+			self.mapsPending += job.mapQueued()
+			self.redsPending += job.redQueued()
+
+	# Get a queued map (for a node with the locality model)
+	def getMapTask(self, node=None):
+		self.updateSubmitted()
+		mapTask = None
+		if self.mapsPending > 0:
+			if node != None and self.locality != None:
+				mapTask = self.locality.getMapTask(node)
+			else:
+				mapTask = self.scheduler.getTask(Task.Type.MAP)
+			if mapTask != None:
+				self.mapsPending -= 1
+				self.scheduler.startAttempt(mapTask)
+		return mapTask
 
 	# Get a queued reduce
 	def getRedTask(self):
-		for jobId in self.jobsQueue:
-			job = self.jobs[jobId]
-			if self.t >= job.submit:
-				redTask = job.getRedTask()
-				if redTask != None:
-					return redTask
-		return None
+		self.updateSubmitted()
+		redTask = None
+		if self.redsPending > 0:
+			redTask = self.scheduler.getTask(Task.Type.RED)
+			if redTask != None:
+				self.redsPending -= 1
+				self.scheduler.startAttempt(redTask)
+		return redTask
 
 	# Check if there is a map queued
 	def mapQueued(self):
-		ret = 0
-		for jobId in self.jobsQueue:
-			job = self.jobs[jobId]
-			if self.t >= job.submit:
-				ret += job.mapQueued()
-		return ret
+		self.updateSubmitted()
+		return self.mapsPending
 
 	# Check if the node is required: running job or providing data for a job
 	def isNodeRequired(self, nodeId):
@@ -142,21 +262,36 @@ class Simulator(SchedulerPolicy):
 		# Check if the node is in the covering subset (data) or is running
 		if node.covering or node.isRunning():
 			return True
-		# Check if it has executed tasks from active tasks
-		for jobId in self.jobsQueue:
-			job = self.jobs[jobId]
-			if job.isRunning() and nodeId in job.getNodes():
-				return True
-		return False
+		# Check if it has executed tasks from active jobs
+		return len(self.nodeJobs.get(nodeId, ())) > 0
+
+	# Update the index of active jobs per node
+	def addJobNode(self, jobId, nodeId):
+		if nodeId not in self.nodeJobs:
+			self.nodeJobs[nodeId] = set()
+		self.nodeJobs[nodeId].add(jobId)
+		if jobId not in self.jobNodes:
+			self.jobNodes[jobId] = set()
+		self.jobNodes[jobId].add(nodeId)
+
+	def removeJobNodes(self, jobId):
+		for nodeId in self.jobNodes.pop(jobId, ()):
+			self.nodeJobs[nodeId].discard(jobId)
+			if self.nodeManagement:
+				self.power.candidates.add(nodeId)
+
+	# Change the power status of a node
+	def setNodeStatus(self, node, status):
+		if self.power != None:
+			self.power.setStatus(node, status)
+		else:
+			node.setStatus(status)
+			self.history.logNodeStatus(self.t, node)
 
 	# Check if there is a reduce queued
 	def redQueued(self):
-		ret = 0
-		for jobId in self.jobsQueue:
-			job = self.jobs[jobId]
-			if self.t >= job.submit:
-				ret += job.redQueued()
-		return ret
+		self.updateSubmitted()
+		return self.redsPending
 
 	def getNodesUtilization(self):
 		utilizations = []
@@ -191,67 +326,468 @@ class Simulator(SchedulerPolicy):
 			ret = ret / len(self.jobs)
 		return ret
 
+	# Average time from submission to completion per finished job in seconds
+	def getTurnaround(self):
+		ret = None
+		if len(self.jobsDone) > 0:
+			ret = 0.0
+			for jobId in self.jobsDone:
+				job = self.jobs[jobId]
+				ret += job.finish - job.submit
+			ret = ret / len(self.jobsDone)
+		return ret
+
+	# Time from the first submission to the last completion in seconds
+	def getMakespan(self):
+		ret = None
+		if len(self.jobsDone) > 0:
+			submit = min(self.jobs[jobId].submit for jobId in self.jobs)
+			finish = max(self.jobs[jobId].finish for jobId in self.jobsDone)
+			ret = finish - submit
+		return ret
 
 	def isTimeLimit(self):
 		return not (self.maxTime==None or self.t < self.maxTime)
 
+	# Mark the attempts that finished at this time as completed
+	def completeAttempts(self, completedAttempts):
+		completedJobs = []
+		for attempt in completedAttempts:
+			attempt.finish = self.t
+			# Check if we finish the jobs
+			job = attempt.getJob()
+			ready = job.isRedReady()
+			completedJobs += job.completeAttempt(attempt)
+			self.scheduler.completeAttempt(attempt)
+			# Enough maps release the reduces (slow start)
+			if not ready and job.isRedReady():
+				self.redsPending += job.redQueued()
+				self.scheduler.updateJob(job)
+			if self.nodeManagement:
+				self.power.candidates.add(attempt.nodeId)
+			# Log
+			self.history.logAttempt(attempt)
+
+		for job in completedJobs:
+			job.finish = self.t
+			job.status = Job.Status.SUCCEEDED
+			# Update queues
+			self.jobsQueue.remove(job.jobId)
+			self.jobsSubmitted.remove(job.jobId)
+			self.scheduler.removeJob(job)
+			self.jobsDone.append(job.jobId)
+			self.removeJobNodes(job.jobId)
+			if self.locality != None:
+				self.locality.removeJob(job)
+			# Log
+			self.history.logJob(job)
+			if self.releaseTasks:
+				job.releaseTasks()
+
+	# Assign queued attempts to the idle slots. It returns the attempts started.
+	def assignAttempts(self):
+		ret = []
+		# Maps
+		if self.profiler != None:
+			self.profiler.start(PhaseProfiler.MAPS)
+		if self.locality != None:
+			ret += self.assignLocalMaps()
+		else:
+			while self.mapQueued()>0 and self.getIdleNodeMap() != None:
+				# Get a map that needs to be executed and assign it to a node
+				idleNode = self.getIdleNodeMap()
+				mapAttempt = self.getMapTask()
+				mapAttempt.start = self.t
+				# Start running in a node
+				idleNode.assignMap(mapAttempt)
+				self.addJobNode(mapAttempt.getJobId(), idleNode.nodeId)
+				ret.append(mapAttempt)
+		# Reduces
+		if self.profiler != None:
+			self.profiler.stop()
+			self.profiler.start(PhaseProfiler.REDS)
+		while self.redQueued()>0 and self.getIdleNodeRed() != None:
+			# Get a map that needs to be executed and assign it to a node
+			idleNode = self.getIdleNodeRed()
+			redAttempt = self.getRedTask()
+			redAttempt.start = self.t
+			idleNode.assignRed(redAttempt)
+			self.addJobNode(redAttempt.getJobId(), idleNode.nodeId)
+			ret.append(redAttempt)
+		if self.profiler != None:
+			self.profiler.stop()
+		return ret
+
+	# Assign maps node by node: a node may get no map while the jobs wait for local ones
+	def assignLocalMaps(self):
+		ret = []
+		self.locality.wakeup = None
+		if self.mapQueued() == 0:
+			return ret
+		for idleNode in self.getIdleNodesMap():
+			while self.mapQueued()>0 and len(idleNode.maps) < idleNode.numMaps:
+				mapAttempt = self.getMapTask(idleNode)
+				if mapAttempt == None:
+					break
+				mapAttempt.start = self.t
+				idleNode.assignMap(mapAttempt)
+				self.addJobNode(mapAttempt.getJobId(), idleNode.nodeId)
+				ret.append(mapAttempt)
+		return ret
+
+	'''
+	Checkpoints.
+	The snapshot is the pickled simulator. The history stores its position in the
+	log and the restored simulator continues writing from there. The job source
+	(streaming) is not stored: it has to be given again with resumeJobSource().
+	The profiler measures the wall time of this process: the restored simulation
+	starts a new one.
+	'''
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['jobSource'] = None
+		if isinstance(self.history, ProfiledHistory):
+			state['history'] = self.history.history
+		if self.profiler != None:
+			state['profiler'] = PhaseProfiler()
+		state['nodeTable'] = nodeTable.nodeIds
+		return state
+
+	def __setstate__(self, state):
+		nodeIds = state.pop('nodeTable')
+		self.__dict__.update(state)
+		self.jobsQueue.key = self.schedulingPolicy
+		self.jobsSubmitted.key = self.schedulingPolicy
+		self.scheduler.setKeys()
+		# Node indices of the compact tasks
+		for i, nodeId in enumerate(nodeIds):
+			if nodeTable.getIndex(nodeId) != i:
+				raise ValueError('the node table of the checkpoint does not match this process')
+
+	# Save the state of the simulation
+	def checkpoint(self, filename):
+		if '%' in filename:
+			filename = filename % self.t
+		tmpFile = filename + '.tmp'
+		f = gzip.open(tmpFile, 'wb', 1) if filename.endswith('.gz') else open(tmpFile, 'wb')
+		try:
+			cPickle.dump(self, f, cPickle.HIGHEST_PROTOCOL)
+		finally:
+			f.close()
+		os.rename(tmpFile, filename)
+		self.checkpointWall = time.time()
+		return filename
+
+	# Load a simulation saved with checkpoint(). It continues with resume().
+	@staticmethod
+	def restore(filename):
+		f = gzip.open(filename, 'rb') if filename.endswith('.gz') else open(filename, 'rb')
+		try:
+			return cPickle.load(f)
+		finally:
+			f.close()
+
+	# Save a checkpoint if the simulation reached a checkpoint time or interval
+	def checkCheckpoint(self):
+		save = False
+		while len(self.checkpointTimes) > 0 and self.checkpointTimes[0] <= self.t:
+			self.checkpointTimes.pop(0)
+			save = True
+		if self.checkpointInterval != None:
+			if self.checkpointWall == None:
+				self.checkpointWall = time.time()
+			elif time.time() - self.checkpointWall >= self.checkpointInterval:
+				save = True
+		if save:
+			self.checkpoint(self.checkpointFile)
+
+	# Change the scheduling policy of the queued jobs
+	def setSchedType(self, schedType):
+		self.schedType = schedType
+		self.jobsQueue.rekey()
+		self.jobsSubmitted.rekey()
+		self.scheduler.rekey()
+
+	'''
+	Select the scheduler by name (see scheduler.SCHEDULERS) or by the number of a
+	scheduling policy. The pools/queues are (name, capacity, priorities) as in
+	scheduler.readQueues(). It can change during the simulation.
+	'''
+	def setScheduler(self, name, queues=None):
+		name = str(name).lower()
+		if name.isdigit() and int(name) in SchedulerPolicy.Type.toString:
+			name = SchedulerPolicy.Type.toString[int(name)]
+		if name not in SCHEDULERS:
+			raise ValueError('unknown scheduler %s (%s)' % (name, ', '.join(sorted(SCHEDULERS))))
+		for schedType, policy in SchedulerPolicy.Type.toString.items():
+			if policy == name:
+				self.setSchedType(schedType)
+		self.scheduler = SCHEDULERS[name](self, queues)
+		# Jobs and attempts already in the simulation
+		for jobId in self.jobsSubmitted:
+			self.scheduler.addJob(self.jobs[jobId])
+		for node in self.nodes.values():
+			for attempt in node.maps + node.reds:
+				self.scheduler.startAttempt(attempt)
+
+	# Take into account the nodes added to self.nodes or with new slots
+	def updateNodes(self):
+		pool = self.getPool()
+		self.scheduler.updateNodes()
+		for node in self.nodes.values():
+			pool.update(node)
+			if self.power != None and node.nodeId not in self.power.since:
+				self.power.addNode(node)
+		# The event engine breaks ties in the order runSteps() visits the nodes
+		if self.nodeOrder != None:
+			self.nodeOrder.clear()
+			self.nodeOrder.update((node.nodeId, i) for i, node in enumerate(self.nodes.values()))
+		if self.completions != None:
+			self.completions[:] = [(event[0], self.nodeOrder[event[-1].nodeId]) + event[2:] for event in self.completions]
+			heapq.heapify(self.completions)
+
 	# Run simulation
 	def run(self):
+		self.start()
+		self.resume()
+
+	def start(self):
 		# Log initial node status
 		for nodeId in self.nodes:
 			node = self.nodes[nodeId]
 			self.history.logNodeStatus(self.t, node)
+		self.power = PowerManager(self)
+
+	# Run (or continue running) the simulation until the jobs finish
+	def resume(self):
+		self.advance()
 
-		# Iterate every X seconds
-		while len(self.jobsQueue) > 0 and not self.isTimeLimit():
+		# Log final output
+		if self.logfile != None:
+			self.history.close()
+			viewer = HistoryViewer(self.history.getFilename())
+			viewer.generate()
+
+	# Run until the jobs finish or the time reaches maxTime
+	def advance(self):
+		self.checkpointTimes = sorted(self.checkpointTimes)
+		if self.profiler != None:
+			history = self.history
+			self.history = ProfiledHistory(history, self.profiler)
+			self.profiler.begin(self.t)
+		if self.eventDriven:
+			self.runEvents()
+		else:
+			self.runSteps()
+		if self.profiler != None:
+			self.profiler.end(self.t)
+			self.history = history
+		if self.power != None:
+			self.energy = self.power.getEnergy()
+
+	# Progress the attempts in the table. It returns the completed attempts in the order runSteps() visits them.
+	def progressTable(self):
+		# The reduces that copied the map outputs start reducing, the others copy
+		shuffling = []
+		for attempt in self.shuffling:
+			if attempt.isShuffled():
+				self.attemptTable.setSpeed(attempt, self.nodes[attempt.nodeId].speed)
+			else:
+				attempt.shuffle(self.STEP*self.nodes[attempt.nodeId].getShuffleRate())
+				shuffling.append(attempt)
+		self.shuffling = shuffling
+		completedAttempts = self.attemptTable.progress(self.STEP)
+		completedAttempts.sort(key=lambda attempt: (self.nodeOrder[attempt.nodeId], attempt.isRed(), attempt.seq))
+		for attempt in completedAttempts:
+			self.attemptTable.remove(attempt)
+			self.nodes[attempt.nodeId].removeAttempt(attempt)
+		return completedAttempts
+
+	# Add the attempts started to the table (reduces wait for their shuffle)
+	def addToTable(self, attempts):
+		for attempt in attempts:
+			self.nassigned += 1
+			attempt.seq = self.nassigned
+			speed = self.nodes[attempt.nodeId].speed
+			if attempt.isRed() and not attempt.isShuffled():
+				speed = 0.0
+				self.shuffling.append(attempt)
+			self.attemptTable.add(attempt, speed)
+
+	# Iterate every STEP seconds
+	def runSteps(self):
+		if self.vectorized and self.attemptTable == None:
+			self.attemptTable = AttemptTable()
+			self.nodeOrder = dict((node.nodeId, i) for i, node in enumerate(self.nodes.values()))
+			self.addToTable([attempt for node in self.nodes.values() for attempt in node.maps + node.reds])
+		while self.hasJobs() and not self.isTimeLimit():
+			if self.checkpointFile != None:
+				self.checkCheckpoint()
 			# Run running tasks
 			# =====================================================
-			completedAttempts = []
-			for node in self.nodes.values():
-				completedAttempts += node.progress(self.STEP) # progress 1 second at a time
+			if self.profiler != None:
+				self.profiler.start(PhaseProfiler.PROGRESS)
+			if self.attemptTable != None:
+				completedAttempts = self.progressTable()
+			else:
+				completedAttempts = []
+				for node in self.nodes.values():
+					completedAttempts += node.progress(self.STEP) # progress 1 second at a time
 
 			# Mark completed maps
-			completedJobs = []
-			for attempt in completedAttempts:
-				attempt.finish = self.t
-				# Check if we finish the jobs
-				completedJobs += attempt.getJob().completeAttempt(attempt)
-				# Log
-				self.history.logAttempt(attempt)
-
-			for job in completedJobs:
-				job.finish = self.t
-				job.status = Job.Status.SUCCEEDED
-				# Update queues
-				self.jobsQueue.remove(job.jobId)
-				self.jobsDone.append(job.jobId)
-				# Log
-				self.history.logJob(job)
+			if self.profiler != None:
+				self.profiler.stop()
+				self.profiler.start(PhaseProfiler.COMPLETE)
+			self.completeAttempts(completedAttempts)
+			if self.profiler != None:
+				self.profiler.stop()
 
 			# Check which nodes are available to run tasks
 			# =====================================================
-			# Maps
-			while self.mapQueued()>0 and self.getIdleNodeMap() != None:
-				# Get a map that needs to be executed and assign it to a node
-				idleNode = self.getIdleNodeMap()
-				mapAttempt = self.getMapTask()
-				mapAttempt.start = self.t
-				# Start running in a node
-				idleNode.assignMap(mapAttempt)
-			# Reduces
-			while self.redQueued()>0 and self.getIdleNodeRed() != None:
-				# Get a map that needs to be executed and assign it to a node
-				idleNode = self.getIdleNodeRed()
-				redAttempt = self.getRedTask()
-				redAttempt.start = self.t
-				idleNode.assignRed(redAttempt)
-
+			if self.nodeManagement:
+				self.power.update()
+			attempts = self.assignAttempts()
+			if self.attemptTable != None:
+				self.addToTable(attempts)
+			if self.nodeManagement:
+				self.power.balance()
 
 			# Progress to next period
 			self.t += self.STEP
-
-		# Log final output
-		if self.logfile != None:
-			self.history.close()
-			viewer = HistoryViewer(self.history.getFilename())
-			viewer.generate()
+			if self.metrics != None:
+				self.metrics.record(self, self.t)
+
+	# First time in the STEP grid that is not before a given time
+	def getNextStep(self, t):
+		if t <= self.t:
+			return self.t + self.STEP
+		return self.t + -(-(t - self.t) // self.STEP) * self.STEP
+
+	# Time in the STEP grid when an attempt that starts progressing after some steps (e.g., shuffle) finishes
+	def getAttemptFinish(self, attempt, steps=0):
+		speed = self.nodes[attempt.nodeId].speed
+		if speed == 1.0:
+			return self.getNextStep(self.t + attempt.seconds) + steps*self.STEP
+		# Steps of STEP*speed seconds of work (exact with speeds in 1/1024)
+		work = attempt.seconds*1024
+		step = int(round(self.STEP*speed*1024))
+		return self.t + (steps + max(1, int(-(-work // step))))*self.STEP
+
+	# Steps a reduce needs to copy the rest of the map outputs (all the maps finished)
+	def getShuffleSteps(self, attempt):
+		job = attempt.getJob()
+		left = int(round((len(job.maps)*job.getReduceInput() - attempt.copied)*1024))
+		step = int(round(self.STEP*self.nodes[attempt.nodeId].getShuffleRate()*1024))
+		if left <= 0:
+			return 0
+		return -(-left // step)
+
+	# Copy the map outputs of the reduces waiting for the maps of a job until now (event engine)
+	def syncShuffle(self, jobId):
+		for attempt in self.shuffles[jobId]:
+			steps = (self.t - attempt.updated)/self.STEP
+			attempt.shuffle(steps*self.STEP*self.nodes[attempt.nodeId].getShuffleRate())
+			attempt.updated = self.t
+
+	def addCompletion(self, attempt):
+		event = (self.getAttemptFinish(attempt, self.getShuffleSteps(attempt) if attempt.isRed() else 0), self.nodeOrder[attempt.nodeId], attempt.isRed(), attempt.seq, attempt)
+		heapq.heappush(self.completions, event)
+
+	'''
+	Jump from event to event (attempt completions and job submissions) instead of
+	iterating every STEP seconds. It produces the same schedule and history.
+	'''
+	def runEvents(self):
+		# The state is kept in the simulator for the checkpoints
+		if self.completions == None:
+			# Order in which runSteps() visits the nodes
+			self.nodeOrder = dict((node.nodeId, i) for i, node in enumerate(self.nodes.values()))
+			# Completions: (finish, node order, reduce, assignment order, attempt)
+			self.completions = []
+			self.nassigned = 0
+			# Submissions
+			self.submissions = sorted(set(self.jobs[jobId].submit for jobId in self.jobsQueue))
+			self.submissions.reverse()
+		nodeOrder = self.nodeOrder
+		completions = self.completions
+		submissions = self.submissions
+
+		while self.hasJobs() and not self.isTimeLimit():
+			if self.checkpointFile != None:
+				self.checkCheckpoint()
+			# Finish the attempts that complete now
+			if self.profiler != None:
+				self.profiler.start(PhaseProfiler.PROGRESS)
+			completedAttempts = []
+			while len(completions) > 0 and completions[0][0] <= self.t:
+				completedAttempts.append(heapq.heappop(completions))
+			completedAttempts = [event[-1] for event in completedAttempts]
+			for attempt in completedAttempts:
+				attempt.progress((self.t - attempt.start)*self.nodes[attempt.nodeId].speed)
+				self.nodes[attempt.nodeId].removeAttempt(attempt)
+			# The reduces copied the outputs of the maps finished before
+			jobIds = set(attempt.getJobId() for attempt in completedAttempts if attempt.isMap()) & set(self.shuffles)
+			for jobId in jobIds:
+				self.syncShuffle(jobId)
+			if self.profiler != None:
+				self.profiler.stop()
+				self.profiler.start(PhaseProfiler.COMPLETE)
+			self.completeAttempts(completedAttempts)
+			if self.profiler != None:
+				self.profiler.stop()
+			# With all the maps, the reduces know when they finish
+			for jobId in sorted(jobIds):
+				if self.jobs[jobId].isMapCompleted():
+					for attempt in self.shuffles.pop(jobId):
+						self.addCompletion(attempt)
+
+			# Start new attempts
+			if self.nodeManagement:
+				self.power.update()
+			for attempt in self.assignAttempts():
+				self.nassigned += 1
+				attempt.seq = self.nassigned
+				if attempt.isRed() and not attempt.getJob().isMapCompleted():
+					# Reduce started early (slow start): it copies until the maps finish
+					attempt.updated = self.t
+					self.shuffles.setdefault(attempt.getJobId(), []).append(attempt)
+				else:
+					self.addCompletion(attempt)
+			if self.nodeManagement:
+				self.power.balance()
+
+			# Jump to the next event
+			nextTimes = []
+			while len(submissions) > 0 and submissions[-1] <= self.t:
+				submissions.pop()
+			if len(submissions) > 0:
+				nextTimes.append(self.getNextStep(submissions[-1]))
+			if self.nextJob != None:
+				nextTimes.append(self.getNextStep(self.nextJob.submit))
+			if len(completions) > 0:
+				nextTimes.append(completions[0][0])
+			if self.nodeManagement and self.power.getNextDeadline() != None:
+				nextTimes.append(self.getNextStep(self.power.getNextDeadline()))
+			if self.locality != None and self.locality.wakeup != None:
+				nextTimes.append(self.getNextStep(self.locality.wakeup))
+			if not self.hasJobs():
+				self.t += self.STEP
+			elif len(nextTimes) > 0:
+				if self.maxTime != None:
+					nextTimes.append(self.getNextStep(self.maxTime))
+				self.t = min(nextTimes)
+			elif self.maxTime != None:
+				self.t = self.getNextStep(self.maxTime)
+			else:
+				# Nothing else can happen
+				break
+			if self.metrics != None:
+				self.metrics.record(self, self.t)
+
+		# Update the remaining time of the attempts still running
+		for jobId in self.shuffles:
+			self.syncShuffle(jobId)
+		for node in self.nodes.values():
+			for attempt in node.maps + node.reds:
+				if self.t - self.STEP > attempt.start and not (attempt.isRed() and attempt.getJobId() in self.shuffles):
+					attempt.progress((self.t - self.STEP - attempt.start)*node.speed)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import heapq
+
+"""
+Keeps the nodes with free map and reduce slots ordered by node id.
+Nodes report their changes through update().
+"""
+class SlotPool:
+	def __init__(self):
+		self.nodes = {}
+		# Heaps of node ids (may contain stale entries)
+		self.mapHeap = []
+		self.redHeap = []
+		# Nodes with free slots
+		self.mapFree = set()
+		self.redFree = set()
+		# Running totals: node id -> (on, maps, reduces, map utilization)
+		self.state = {}
+		self.nodesOn = 0
+		self.mapsRunning = 0
+		self.redsRunning = 0
+		self.utilization = 0.0
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def addNode(self, node):
+		self.nodes[node.nodeId] = node
+		node.pool = self
+		self.update(node)
+
+	'''
+	Update the free slots of a node after it starts or finishes an attempt or changes its status.
+	'''
+	def update(self, node):
+		nodeId = node.nodeId
+		isOn = node.status == 'ON'
+		# Maps
+		if isOn and len(node.maps) < node.numMaps:
+			if nodeId not in self.mapFree:
+				self.mapFree.add(nodeId)
+				self.push(self.mapHeap, self.mapFree, nodeId)
+		else:
+			self.mapFree.discard(nodeId)
+		# Reduces
+		if isOn and len(node.reds) < node.numReds:
+			if nodeId not in self.redFree:
+				self.redFree.add(nodeId)
+				self.push(self.redHeap, self.redFree, nodeId)
+		else:
+			self.redFree.discard(nodeId)
+		# Totals
+		state = (isOn, len(node.maps), len(node.reds), 1.0*len(node.maps)/node.numMaps if isOn and node.numMaps > 0 else 0.0)
+		prev = self.state.get(nodeId)
+		if prev != state:
+			if prev != None:
+				self.nodesOn -=     prev[0]
+				self.mapsRunning -= prev[1]
+				self.redsRunning -= prev[2]
+				self.utilization -= prev[3]
+			self.nodesOn +=     state[0]
+			self.mapsRunning += state[1]
+			self.redsRunning += state[2]
+			self.utilization += state[3]
+			self.state[nodeId] = state
+
+	# Average map slot utilization of the nodes that are on (as Simulator.getNodesUtilization)
+	def getUtilization(self):
+		if self.nodesOn > 0:
+			return self.utilization/self.nodesOn
+		return 1.0
+
+	def push(self, heap, free, nodeId):
+		# Rebuild the heap when it is mostly stale entries
+		if len(heap) > 2*len(free) + 64:
+			heap[:] = sorted(free)
+		else:
+			heapq.heappush(heap, nodeId)
+
+	def first(self, heap, free):
+		while len(heap) > 0 and heap[0] not in free:
+			heapq.heappop(heap)
+		if len(heap) > 0:
+			return self.nodes[heap[0]]
+		return None
+
+	# First node (by id) with a free map slot
+	def getIdleNodeMap(self):
+		return self.first(self.mapHeap, self.mapFree)
+
+	# First node (by id) with a free reduce slot
+	def getIdleNodeRed(self):
+		return self.first(self.redHeap, self.redFree)
+
+	def getIdleNodesMap(self):
+		return [self.nodes[nodeId] for nodeId in sorted(self.mapFree)]
+
+	def getIdleNodesRed(self):
+		return [self.nodes[nodeId] for nodeId in sorted(self.redFree)]
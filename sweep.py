@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+import copy
+import csv
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+
+from job import Job
+from workloadmanager import WorkloadManager
+from runsimulator import getParser
+from runsimulator import createSimulator
+
+'''
+Run runsimulator over a grid of options in parallel processes.
+The workload is parsed once and shared with the workers.
+'''
+
+METRICS = ['perf', 'turnaround', 'makespan', 'jobs', 'simtime', 'walltime']
+
+# Workload of the worker: (nmaps, lmap, nreds, lred, submit, priority) per job
+workload = None
+
+def setWorkload(rows):
+	global workload
+	workload = rows
+
+def getJobs(rows):
+	for nmaps, lmap, nreds, lred, submit, priority in rows:
+		job = Job(nmaps=nmaps, lmap=lmap, nreds=nreds, lred=lred, submit=submit)
+		job.priority = priority
+		yield job
+
+# Convert a value of the grid to the type of its option
+def parseValue(option, value):
+	if option.action == 'store_true':
+		return str(value).lower() in ('1', 'true', 'yes')
+	elif option.type == 'int':
+		return int(value)
+	elif option.type == 'float':
+		return float(value)
+	return str(value)
+
+def getOption(parser, name):
+	for option in parser.option_list:
+		if option.dest == name:
+			return option
+	raise ValueError('unknown option %s' % name)
+
+'''
+Parameter grid from name=v1,v2 strings and/or a JSON file {name: [v1, v2]}.
+Returns the list of points (dictionaries).
+'''
+def getGrid(parser, grid, gridfile=None):
+	values = []
+	if gridfile != None:
+		with open(gridfile) as f:
+			for name, vs in sorted(json.load(f).items()):
+				values.append((name, vs))
+	for param in grid:
+		name, vs = param.split('=', 1)
+		values.append((name, vs.split(',')))
+	names = []
+	for name, vs in values:
+		option = getOption(parser, name)
+		names.append((name, [parseValue(option, v) for v in vs]))
+	ret = []
+	for point in itertools.product(*[vs for name, vs in names]):
+		ret.append(dict(zip([name for name, vs in names], point)))
+	return ret
+
+# Run one point of the grid
+def runPoint(args):
+	options, point = args
+	options = copy.copy(options)
+	for name, value in point.items():
+		setattr(options, name, value)
+	options.log = None
+	jobs = None
+	if workload != None:
+		jobs = getJobs(workload)
+	simulator = createSimulator(options, jobs)
+	start = time.time()
+	simulator.run()
+	return getResults(simulator, point, time.time() - start)
+
+# Metrics of a finished simulation
+def getResults(simulator, point, walltime):
+	ret = dict(point)
+	ret['perf'] =       simulator.getPerformance()
+	ret['turnaround'] = simulator.getTurnaround()
+	ret['makespan'] =   simulator.getMakespan()
+	ret['jobs'] =       len(simulator.jobsDone)
+	ret['simtime'] =    simulator.t
+	ret['walltime'] =   walltime
+	return ret
+
+def writeResults(results, names, out):
+	if out != None and out.endswith('.json'):
+		with open(out, 'w') as f:
+			json.dump(results, f, indent=1, sort_keys=True)
+		return
+	f = open(out, 'w') if out != None else sys.stdout
+	writer = csv.DictWriter(f, fieldnames=names+METRICS)
+	writer.writeheader()
+	for result in results:
+		writer.writerow(result)
+	if out != None:
+		f.close()
+
+if __name__ == "__main__":
+	parser = getParser()
+	parser.usage = "usage: %prog [runsimulator options] -G name=v1,v2 ..."
+	parser.add_option('-G', "--grid",action="append",   dest="grid",      default=[],    help="option and values to sweep: name=v1,v2,... (option names as in runsimulator)")
+	parser.add_option('-F', "--gridfile",               dest="gridfile",  type="string", default=None,  help="JSON file with the values to sweep {name: [v1, v2]}")
+	parser.add_option('-o', "--out",                    dest="out",       type="string", default=None,  help="results file, CSV or .json (default: CSV to the output)")
+	parser.add_option('-P', "--processes",              dest="processes", type="int",    default=None,  help="number of processes (default: all cores)")
+	(options, args) = parser.parse_args()
+
+	points = getGrid(parser, options.grid, options.gridfile)
+	names = sorted(points[0].keys()) if len(points) > 0 else []
+
+	# Parse the workload once
+	rows = None
+	if len(options.infile) > 0:
+		rows = [(job.nmaps, job.lmap, job.nreds, job.lred, job.submit, job.priority) for job in WorkloadManager(options.infile, compiled=True).getJobs()]
+
+	start = time.time()
+	pool = multiprocessing.Pool(options.processes, initializer=setWorkload, initargs=(rows,))
+	results = []
+	for result in pool.imap(runPoint, [(options, point) for point in points]):
+		results.append(result)
+		print >>sys.stderr, '%d/%d %s' % (len(results), len(points), ' '.join('%s=%s' % (name, result[name]) for name in names))
+	pool.close()
+	pool.join()
+	writeResults(results, names, options.out)
+	print >>sys.stderr, 'Sweep:   %d points in %.1fs' % (len(points), time.time() - start)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+from array import array
+
+from job import Job
+from job import Task
+from job import Attempt
+
+'''
+Compact task storage.
+The tasks of a job are kept in typed arrays (about 18 bytes per task) and the
+Task/Attempt objects are only created as views when they are accessed. Only the
+running attempts are real objects.
+'''
+
+"""
+Shared table that maps node ids to small integers.
+"""
+class NodeTable:
+	def __init__(self):
+		self.nodeIds = []
+		self.indices = {}
+
+	def getIndex(self, nodeId):
+		if nodeId == None:
+			return -1
+		if nodeId not in self.indices:
+			self.indices[nodeId] = len(self.nodeIds)
+			self.nodeIds.append(nodeId)
+		return self.indices[nodeId]
+
+	def getNodeId(self, index):
+		if index < 0:
+			return None
+		return self.nodeIds[index]
+
+nodeTable = NodeTable()
+
+"""
+Queue of consecutive task indices. Replaces the deque of pending tasks.
+"""
+class TaskRange:
+	def __init__(self, first, last):
+		self.first = first
+		self.last = last
+
+	def __len__(self):
+		return max(0, self.last - self.first + 1)
+
+	def popleft(self):
+		if self.first > self.last:
+			raise IndexError('pop from an empty task range')
+		self.first += 1
+		return self.first - 1
+
+"""
+Tasks of one type (maps or reduces) of a job stored in typed arrays.
+It behaves as the dictionary task index -> Task (indices start at 1).
+"""
+class TaskArray:
+	def __init__(self, job, taskType, ntasks, length, gauss):
+		self.job = job
+		self.taskType = taskType
+		self.gauss = gauss
+		self.ntasks = ntasks
+		self.length =    array('i', [length]) * ntasks
+		self.state =     array('b', [Job.Status.QUEUED]) * ntasks
+		self.start =     array('i', [-1]) * ntasks
+		self.finish =    array('i', [-1]) * ntasks
+		self.node =      array('i', [-1]) * ntasks
+		self.nattempts = array('b', [0]) * ntasks
+		# Attempts running (index -> Attempt)
+		self.running = {}
+
+	def __len__(self):
+		return self.ntasks
+
+	def __contains__(self, index):
+		return 1 <= index <= self.ntasks
+
+	def __getitem__(self, index):
+		if index not in self:
+			raise KeyError(index)
+		return CompactTask(self, index)
+
+	def __iter__(self):
+		return iter(xrange(1, self.ntasks+1))
+
+	def keys(self):
+		return range(1, self.ntasks+1)
+
+	def values(self):
+		return [CompactTask(self, index) for index in xrange(1, self.ntasks+1)]
+
+	def items(self):
+		return [(index, CompactTask(self, index)) for index in xrange(1, self.ntasks+1)]
+
+	# Bytes used by the arrays
+	def getSize(self):
+		ret = 0
+		for values in (self.length, self.state, self.start, self.finish, self.node, self.nattempts):
+			ret += values.itemsize * len(values)
+		return ret
+
+"""
+View of a task stored in a TaskArray.
+"""
+class CompactTask(Task):
+	__slots__ = ('tasks', 'index')
+
+	strId = None
+
+	def __init__(self, tasks, index):
+		self.tasks = tasks
+		self.index = index
+
+	job =      property(lambda self: self.tasks.job)
+	taskType = property(lambda self: self.tasks.taskType)
+	gauss =    property(lambda self: self.tasks.gauss)
+	length =   property(lambda self: self.tasks.length[self.index-1])
+
+	def getStatus(self):
+		return self.tasks.state[self.index-1]
+
+	def setStatus(self, status):
+		self.tasks.state[self.index-1] = status
+
+	status = property(getStatus, setStatus)
+
+	def getNumAttempts(self):
+		return self.tasks.nattempts[self.index-1]
+
+	nattempts = property(getNumAttempts)
+
+	# Attempt number -> Attempt. Finished attempts are rebuilt from the arrays.
+	def getAttempts(self):
+		i = self.index-1
+		nattempts = self.tasks.nattempts[i]
+		if nattempts == 0:
+			return {}
+		if self.index in self.tasks.running:
+			return {nattempts: self.tasks.running[self.index]}
+		attempt = Attempt(task=self, seconds=0, number=nattempts)
+		attempt.start =  self.tasks.start[i]
+		attempt.finish = self.tasks.finish[i]
+		attempt.nodeId = nodeTable.getNodeId(self.tasks.node[i])
+		attempt.status = self.tasks.state[i]
+		return {nattempts: attempt}
+
+	attempts = property(getAttempts)
+
+	def getAttempt(self):
+		if self.tasks.nattempts[self.index-1] == 0:
+			self.tasks.nattempts[self.index-1] += 1
+			attempt = Attempt(task=self, seconds=self.getAttemptLength(), number=self.nattempts)
+			self.tasks.running[self.index] = attempt
+			return attempt
+		return Task.getAttempt(self)
+
+	# Save the finished attempt in the arrays and drop it
+	def complete(self, attempt):
+		i = self.index-1
+		self.tasks.state[i] =  Job.Status.SUCCEEDED
+		self.tasks.start[i] =  attempt.start
+		self.tasks.finish[i] = attempt.finish
+		self.tasks.node[i] =   nodeTable.getIndex(attempt.nodeId)
+		self.tasks.running.pop(self.index, None)
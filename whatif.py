@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import Queue
+import multiprocessing
+import sys
+import time
+
+from history import History
+from node import Node
+from runsimulator import getParser
+from runsimulator import createSimulator
+from runsimulator import getQueues
+from sweep import getGrid
+from sweep import getResults
+from sweep import writeResults
+
+'''
+What-if analysis: run a simulation once until a time and then continue it with
+different settings in parallel processes. The processes are forked from the
+simulation at that time, so the shared prefix is only computed once and its
+memory is shared (copy-on-write).
+'''
+
+# Options that can change after the fork
+VARIANTS = ['schedulingPolicy', 'mapslot', 'redslot', 'nodes']
+
+'''
+Change the settings of a simulation in the middle of the run.
+The nodes removed are switched off: they finish their attempts but do not get new ones.
+'''
+def applyVariant(simulator, point, options):
+	for name in point:
+		if name not in VARIANTS:
+			raise ValueError('%s cannot change after the fork (only %s)' % (name, ', '.join(VARIANTS)))
+	if 'schedulingPolicy' in point:
+		simulator.setScheduler(point['schedulingPolicy'], getQueues(options))
+	# Slots
+	for node in simulator.nodes.values():
+		if 'mapslot' in point:
+			node.numMaps = point['mapslot']
+		if 'redslot' in point:
+			node.numReds = point['redslot']
+	# Nodes
+	nnodes = point.get('nodes', len(simulator.nodes))
+	i = len(simulator.nodes)
+	while len(simulator.nodes) < nnodes:
+		if 'aws%03d' % i not in simulator.nodes:
+			node = Node('aws%03d' % i)
+			node.numMaps = point.get('mapslot', options.mapslot)
+			node.numReds = point.get('redslot', options.redslot)
+			simulator.nodes[node.nodeId] = node
+			simulator.history.logNodeStatus(simulator.t, node)
+		i += 1
+	for nodeId in sorted(simulator.nodes)[nnodes:]:
+		node = simulator.nodes[nodeId]
+		if node.status != 'OFF':
+			simulator.setNodeStatus(node, 'OFF')
+	simulator.updateNodes()
+
+# Continue the simulation with a variant (in a forked process)
+def runVariant(simulator, index, point, options, results):
+	# The history of the prefix belongs to the parent
+	simulator.history.filename = None
+	simulator.history = History(filename=None)
+	simulator.logfile = None
+	simulator.maxTime = None
+	start = time.time()
+	applyVariant(simulator, point, options)
+	simulator.resume()
+	results.put((index, getResults(simulator, point, time.time() - start)))
+
+'''
+Run the simulation until time t and continue it with every variant in parallel.
+It returns the results of the variants in the same order.
+'''
+def forkVariants(simulator, t, points, options, processes=None):
+	simulator.maxTime = t
+	simulator.start()
+	simulator.advance()
+	# Everything in the history has to be written before forking
+	simulator.history.sync()
+	if processes == None:
+		processes = multiprocessing.cpu_count()
+	results = multiprocessing.Queue()
+	ret = [None]*len(points)
+	running = []
+	nextPoint = 0
+	ndone = 0
+	while ndone < len(points):
+		# Start processes
+		while nextPoint < len(points) and len(running) < processes:
+			process = multiprocessing.Process(target=runVariant, args=(simulator, nextPoint, points[nextPoint], options, results))
+			process.start()
+			running.append(process)
+			nextPoint += 1
+		# Wait for a result
+		try:
+			index, result = results.get(timeout=1)
+			ret[index] = result
+			ndone += 1
+			print >>sys.stderr, '%d/%d %s' % (ndone, len(points), ' '.join('%s=%s' % (name, points[index][name]) for name in sorted(points[index])))
+		except Queue.Empty:
+			pass
+		for process in list(running):
+			if not process.is_alive():
+				process.join()
+				if process.exitcode != 0:
+					raise RuntimeError('a variant failed (exit code %d)' % process.exitcode)
+				running.remove(process)
+	for process in running:
+		process.join()
+	return ret
+
+if __name__ == "__main__":
+	parser = getParser()
+	parser.usage = "usage: %prog [runsimulator options] -T time -G name=v1,v2 ..."
+	parser.add_option('-T', "--time",                       dest="time",      type="int",    default=0,     help="simulated time of the fork")
+	parser.add_option('-G', "--grid",action="append",   dest="grid",      default=[],    help="settings to try after the fork: name=v1,v2,... (%s)" % ', '.join(VARIANTS))
+	parser.add_option('-F', "--gridfile",               dest="gridfile",  type="string", default=None,  help="JSON file with the settings to try {name: [v1, v2]}")
+	parser.add_option('-o', "--out",                    dest="out",       type="string", default=None,  help="results file, CSV or .json (default: CSV to the output)")
+	parser.add_option('-P', "--processes",              dest="processes", type="int",    default=None,  help="number of processes (default: all cores)")
+	(options, args) = parser.parse_args()
+
+	points = getGrid(parser, options.grid, options.gridfile)
+	names = sorted(points[0].keys()) if len(points) > 0 else []
+
+	start = time.time()
+	simulator = createSimulator(options)
+	results = forkVariants(simulator, options.time, points, options, options.processes)
+	simulator.history.close()
+	writeResults(results, names, options.out)
+	print >>sys.stderr, 'What-if: %d variants from %ds in %.1fs' % (len(points), options.time, time.time() - start)
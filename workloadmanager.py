@@ -1,5 +1,12 @@
+from optparse import OptionParser
+from array import array
+
 import sys
+import os
 import random
+import gzip
+import mmap
+import struct
 
 from job import Job
 from simulator import Simulator
@@ -8,35 +15,212 @@ from simulator import Simulator
 Read workload from a file.
 '''
 class WorkloadManager:
-        def __init__(self, filename=None):
+	def __init__(self, filename=None, compiled=False):
 		self.jobQueue = []
 		if filename != None:
-			self.read(filename)
+			self.read(filename, compiled)
 		#self.jobIdQueue = []
 
-	def read(self, inFile):
+	# Open a workload file, compressed with gzip or not
+	@staticmethod
+	def open(inFile):
+		with open(inFile, "rb") as f:
+			magic = f.read(2)
+		if magic == '\x1f\x8b':
+			return gzip.open(inFile, "r")
+		return open(inFile, "r")
+
+	# Create the job in a line of the workload (None for comments)
+	@staticmethod
+	def parse(line):
+		line = line.replace('\n', '')
+		line = line.strip()
+		if not line.startswith('#') and len(line) > 0:
+			splits = line.split()
+			nmaps0 =      int(splits[0])
+			lmap0 =       int(splits[1])
+			nreds0 =      int(splits[2])
+			lred0 =       int(splits[3])
+			submit0 =     int(splits[4])
+			# Create job
+			job = Job(nmaps=nmaps0, lmap=lmap0, nreds=nreds0, lred=lred0, submit=submit0)
+			# Optional priority
+			if len(splits) > 5:
+				job.priority = int(splits[5])
+			return job
+		return None
+
+	'''
+	Read all the jobs of a workload.
+	With compiled, it uses (and builds or rebuilds if needed) the binary version of the file.
+	'''
+	def read(self, inFile, compiled=False):
+		binFile = BinaryWorkload.getFile(inFile, compiled)
+		if binFile != None:
+			workload = BinaryWorkload(binFile)
+			self.jobQueue.extend(workload)
+			workload.close()
+			return self.jobQueue
 		#lineno=0
-		with open(inFile, "r") as f:
+		with WorkloadManager.open(inFile) as f:
 			for line in f:
-				line = line.replace('\n', '')
-				line = line.strip()
-				if not line.startswith('#') and len(line) > 0:
-					splits = line.split()
-					nmaps0 =      int(splits[0])
-					lmap0 =       int(splits[1])
-					nreds0 =      int(splits[2])
-					lred0 =       int(splits[3])
-					submit0 =     int(splits[4])
-					# Create job
-					job = Job(nmaps=nmaps0, lmap=lmap0, nreds=nreds0, lred=lred0, submit=submit0)
+				job = WorkloadManager.parse(line)
+				if job != None:
 					self.jobQueue.append(job)
 					#lineno+=1
 		#return lineno
 		return self.jobQueue
 
+	'''
+	Generate the jobs of a workload one by one without loading the whole file.
+	The jobs must be sorted by submission time.
+	With compiled, it uses the binary version of the file if it is up to date
+	(it does not build it: the first job would wait for the whole file).
+	'''
+	@staticmethod
+	def stream(inFile, compiled=False):
+		binFile = BinaryWorkload.getFile(inFile, compiled, build=False)
+		if binFile != None:
+			jobs = BinaryWorkload(binFile)
+		else:
+			jobs = WorkloadManager.streamText(inFile)
+		submit = None
+		for lineno, job in enumerate(jobs, 1):
+			if submit != None and job.submit < submit:
+				raise ValueError('%s: job %d submitted at %d after a job submitted at %d' % (inFile, lineno, job.submit, submit))
+			submit = job.submit
+			yield job
+
+	@staticmethod
+	def streamText(inFile):
+		with WorkloadManager.open(inFile) as f:
+			for line in f:
+				job = WorkloadManager.parse(line)
+				if job != None:
+					yield job
+
 	def getJobs(self):
 		return self.jobQueue
 
 
+"""
+Workload compiled into a binary columnar file that is memory-mapped to load it.
+The jobs are read from the mapped file when they are needed.
+Header: magic, version, number of jobs, size and modification time of the source.
+Then one column of little-endian 32-bit integers per field.
+"""
+class BinaryWorkload:
+	MAGIC = 'HSWB'
+	VERSION = 1
+	HEADER = struct.Struct('<4sIQQd')
+	COLUMNS = ('nmaps', 'lmap', 'nreds', 'lred', 'submit', 'priority')
+	VALUE = struct.Struct('<i')
+
+	def __init__(self, filename):
+		self.filename = filename
+		with open(self.filename, 'rb') as f:
+			self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, self.njobs, self.srcSize, self.srcTime = BinaryWorkload.HEADER.unpack_from(self.mmap, 0)
+		if magic != BinaryWorkload.MAGIC or version != BinaryWorkload.VERSION:
+			raise ValueError('%s is not a compiled workload' % filename)
+		# Offset of each column
+		self.offsets = [BinaryWorkload.HEADER.size + 4*self.njobs*i for i in range(0, len(BinaryWorkload.COLUMNS))]
+
+	def close(self):
+		self.mmap.close()
+
+	def __len__(self):
+		return self.njobs
+
+	def getJob(self, i):
+		nmaps, lmap, nreds, lred, submit, priority = [BinaryWorkload.VALUE.unpack_from(self.mmap, offset + 4*i)[0] for offset in self.offsets]
+		job = Job(nmaps=nmaps, lmap=lmap, nreds=nreds, lred=lred, submit=submit)
+		job.priority = priority
+		return job
+
+	def __iter__(self):
+		for i in xrange(0, self.njobs):
+			yield self.getJob(i)
+
+	# Compiled file for a workload
+	@staticmethod
+	def getFilename(inFile):
+		return inFile + '.bin'
+
+	@staticmethod
+	def isBinary(filename):
+		with open(filename, 'rb') as f:
+			return f.read(len(BinaryWorkload.MAGIC)) == BinaryWorkload.MAGIC
+
+	# Check if the compiled file corresponds to the current source
+	@staticmethod
+	def isUpdated(inFile, binFile):
+		try:
+			with open(binFile, 'rb') as f:
+				header = f.read(BinaryWorkload.HEADER.size)
+			magic, version, njobs, srcSize, srcTime = BinaryWorkload.HEADER.unpack(header)
+		except (IOError, struct.error):
+			return False
+		stat = os.stat(inFile)
+		return magic == BinaryWorkload.MAGIC and version == BinaryWorkload.VERSION and srcSize == stat.st_size and srcTime == stat.st_mtime
+
+	'''
+	Compile a workload file into the binary format.
+	'''
+	@staticmethod
+	def compile(inFile, binFile=None):
+		if binFile == None:
+			binFile = BinaryWorkload.getFilename(inFile)
+		columns = [array('i') for column in BinaryWorkload.COLUMNS]
+		for job in WorkloadManager.streamText(inFile):
+			for values, column in zip(columns, BinaryWorkload.COLUMNS):
+				values.append(getattr(job, column))
+		stat = os.stat(inFile)
+		# Write in a temporary file and replace the old one
+		tmpFile = binFile + '.tmp'
+		with open(tmpFile, 'wb') as f:
+			f.write(BinaryWorkload.HEADER.pack(BinaryWorkload.MAGIC, BinaryWorkload.VERSION, len(columns[0]), stat.st_size, stat.st_mtime))
+			for values in columns:
+				if sys.byteorder == 'big':
+					values.byteswap()
+				f.write(values.tostring())
+		os.rename(tmpFile, binFile)
+		return binFile
+
+	'''
+	Binary file to load a workload: the workload itself if it is compiled.
+	With compiled, the compiled version of a text workload, built if it is missing or outdated
+	(only with build). None if the text has to be parsed.
+	'''
+	@staticmethod
+	def getFile(inFile, compiled=False, build=True):
+		if BinaryWorkload.isBinary(inFile):
+			return inFile
+		if compiled:
+			binFile = BinaryWorkload.getFilename(inFile)
+			if BinaryWorkload.isUpdated(inFile, binFile):
+				return binFile
+			if not build:
+				return None
+			try:
+				return BinaryWorkload.compile(inFile, binFile)
+			except (IOError, OSError):
+				# Cannot write next to the source
+				return None
+		return None
+
+
 if __name__ == '__main__':
-	workload = WorkloadManager(sys.argv[1])
+	parser = OptionParser(usage="usage: %prog [options] workload")
+	parser.add_option('-c', "--compile",action="store_true", dest="compile",   default=False, help="compile the workload into the binary format")
+	parser.add_option('-o', "--out",                        dest="out",       type="string", default=None,  help="compiled file (default: workload.bin)")
+	(options, args) = parser.parse_args()
+	if len(args) != 1:
+		parser.error('specify a workload file')
+
+	if options.compile:
+		binFile = BinaryWorkload.compile(args[0], options.out)
+		print 'Compiled %d jobs into %s' % (len(BinaryWorkload(binFile)), binFile)
+	else:
+		workload = WorkloadManager(args[0])
+		print 'Jobs:    %d' % len(workload.getJobs())